@@ -0,0 +1,54 @@
+"""Core app configuration"""
+
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    """Workflow engine app"""
+    name = 'activflow.core'
+
+    def ready(self):
+        """Compiles registered workflows and their forms
+        once at startup, connects invalidation of cached fragments,
+        roles and user groups and unlinking of deleted activities,
+        registers the check of the groups cache"""
+        from django.contrib.auth.models import Group, User
+        from django.contrib.auth.signals import user_logged_in
+        from django.core import checks
+        from django.db.models.signals import (
+            m2m_changed,
+            post_delete,
+            post_save)
+
+        from activflow.core.constants import WORKFLOW_APPS
+        from activflow.core.fragments import invalidate_instance
+        from activflow.core.helpers import warm_forms
+        from activflow.core.permissions import (
+            group_changed,
+            logged_in,
+            membership_changed)
+        from activflow.core.models import Request, Task, unlink_activity
+        from activflow.core.registry import registry
+        from activflow.core.roles import check_groups_cache, clear_roles
+
+        registry.populate(WORKFLOW_APPS)
+        checks.register(check_groups_cache)
+
+        for module in WORKFLOW_APPS:
+            warm_forms(module)
+
+        # connected per model, other models keep fast (signal-less)
+        # bulk deletes
+        activities = {
+            activity.model for workflow in registry.workflows.values()
+            for activity in workflow.activities.values()}
+        senders = {Request, Task}.union(activities)
+        for signal in (post_save, post_delete):
+            for sender in senders:
+                signal.connect(invalidate_instance, sender=sender)
+            signal.connect(clear_roles, sender=Group)
+            signal.connect(group_changed, sender=Group)
+        for sender in activities:
+            post_delete.connect(unlink_activity, sender=sender)
+        m2m_changed.connect(membership_changed, sender=User.groups.through)
+        user_logged_in.connect(logged_in)
@@ -0,0 +1,351 @@
+"""Bulk workflow operations
+
+Rows are validated with the same form and inline formset classes
+used by the activity views, then persisted chunk by chunk: every
+chunk is written with a handful of bulk inserts/updates inside its
+own transaction, so a failing chunk is reported without discarding
+the chunks written before it.
+
+Bulk writes bypass ``save()`` and model signals of the activity and
+related item models; cached fragments of the workflow requests they
+modify are invalidated explicitly.
+"""
+
+from collections import namedtuple
+from itertools import islice
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from activflow.core.constants import BULK_CHUNK_SIZE
+from activflow.core.fragments import invalidate
+from activflow.core.helpers import flow_config, form_class, formset_classes
+from activflow.core.models import Request, Task
+from activflow.core.roles import roles
+from activflow.core.rules import evaluate
+
+
+BulkResult = namedtuple('BulkResult', [
+    'created',  # row index / task id -> id of created request / task
+    'errors'    # row index / task id -> {field or relation: [messages]}
+])
+
+
+def chunked(rows, size):
+    """Yields lists of (index, row) of at most size rows"""
+    rows = enumerate(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bulk_insert(model, objects):
+    """Inserts objects with bulk_create and sets their primary keys,
+    also on backends which cannot return them from the insert"""
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(objects)
+
+    if connection.vendor != 'sqlite':
+        for obj in objects:
+            obj.save(force_insert=True)
+        return objects
+
+    model.objects.bulk_create(objects)
+
+    # SQLite: the (still open) transaction holds the write lock, so
+    # the last rows of the table are the ones just inserted, in order
+    identifiers = model.objects.order_by('-pk').values_list(
+        'pk', flat=True)[:len(objects)]
+    for (obj, identifier) in zip(objects, reversed(list(identifiers))):
+        obj.pk = identifier
+
+    return objects
+
+
+def save_formset(formset, instance):
+    """Persists a validated inline formset of the (saved) instance:
+    new rows with one bulk insert, changed rows with one bulk update
+    per set of changed fields, deleted rows with one delete"""
+    model = formset.model
+    if model._meta.many_to_many:  # m2m data is saved per form
+        formset.instance = instance
+        return formset.save()
+
+    fk = formset.fk.name
+    fields = {field.name for field in model._meta.concrete_fields if (
+        not field.primary_key)}
+    auto_now = [field.name for field in model._meta.concrete_fields if (
+        getattr(field, 'auto_now', False))]
+    deleted_forms = set(formset.deleted_forms) if formset.can_delete else ()
+    (created, changed, deleted) = ([], {}, [])
+    now = timezone.now()
+
+    for form in formset.initial_forms:
+        obj = form.instance
+        if obj.pk is None:
+            continue
+        if form in deleted_forms:
+            deleted.append(obj.pk)
+        elif form.has_changed():
+            names = tuple(sorted(fields.intersection(form.changed_data)))
+            if names:
+                for name in auto_now:  # not set by bulk_update
+                    setattr(obj, name, now)
+                changed.setdefault(names, []).append(obj)
+
+    for form in formset.extra_forms:
+        if form.has_changed() and form not in deleted_forms:
+            obj = form.instance
+            setattr(obj, fk, instance)
+            created.append(obj)
+
+    if deleted:
+        model.objects.filter(pk__in=deleted).delete()
+    for (names, objects) in changed.items():
+        model.objects.bulk_update(objects, list(names) + auto_now)
+    if created:
+        model.objects.bulk_create(created)
+
+
+def formset_data(formset, items):
+    """Returns POST-like data of an inline formset for a list
+    of related item payloads"""
+    prefix = formset.form.__name__
+    data = {
+        '{}-TOTAL_FORMS'.format(prefix): len(items),
+        '{}-INITIAL_FORMS'.format(prefix): 0,
+    }
+    for (index, item) in enumerate(items):
+        for (field, value) in item.items():
+            data['{}-{}-{}'.format(prefix, index, field)] = value
+    return data
+
+
+def form_errors(form):
+    """Returns {field: [messages]} of a form"""
+    return {field: list(messages) for (field, messages) in (
+        form.errors.items())}
+
+
+def validate(module, model, row):
+    """Validates an initial activity payload. Inline items are given
+    as lists under the related model names, e.g.
+
+        {'subject': 'Test', 'bar': 'Example', 'FooLineItem': [{...}]}
+
+    Returns (form, formsets, errors), form and formsets being None
+    for a payload which is not an object"""
+    if not isinstance(row, dict):
+        return (None, None, {'__all__': ['Expected an object']})
+
+    row = dict(row)
+    formsets = []
+    errors = {}
+
+    for formset_class in formset_classes(module, model, 'create'):
+        relation = formset_class.model.__name__
+        items = row.pop(relation, [])
+        if not isinstance(items, list) or not all(
+                isinstance(item, dict) for item in items):
+            errors[relation] = ['Expected a list of objects']
+            continue
+
+        formset = formset_class(
+            formset_data(formset_class, items),
+            prefix=formset_class.form.__name__)
+        formsets.append(formset)
+        if not formset.is_valid():
+            errors[relation] = [form_errors(form) for form in (
+                formset.forms)] + list(formset.non_form_errors())
+
+    form = form_class(module, model, 'create')(row)
+    if not form.is_valid():
+        errors.update(form_errors(form))
+
+    return (form, formsets, errors)
+
+
+def persist(module, user, role, rows):
+    """Writes requests, tasks, activities and related items of
+    validated (form, formsets) rows, tasks being assigned to the
+    group with id role. Returns the requests"""
+    config = flow_config(module)
+
+    requests = bulk_insert(Request, [Request(
+        requester=user,
+        module_ref=module,
+        status='Initiated') for _ in rows])
+
+    tasks = bulk_insert(Task, [Task(
+        request=request,
+        sequence=1,
+        assignee_id=role,
+        updated_by=user,
+        activity_ref=config.INITIAL,
+        status='In Progress') for request in requests])
+
+    activities = []
+    for ((form, _), task) in zip(rows, tasks):
+        activity = form.save(commit=False)
+        activity.task = task
+        activities.append(activity)
+    bulk_insert(config.activities[config.INITIAL].model, activities)
+
+    items = {}
+    for ((_, formsets), activity) in zip(rows, activities):
+        for formset in formsets:
+            for item in formset.save(commit=False):
+                setattr(item, formset.fk.name, activity)
+                items.setdefault(formset.model, []).append(item)
+    for (model, objects) in items.items():
+        if model._meta.many_to_many:  # m2m rows need the primary keys
+            bulk_insert(model, objects)
+        else:
+            model.objects.bulk_create(objects)
+
+    # m2m data is saved per form, once the objects have primary keys
+    for (form, formsets) in rows:
+        if form._meta.model._meta.many_to_many:
+            form.save_m2m()
+        for formset in formsets:
+            if formset.model._meta.many_to_many:
+                formset.save_m2m()
+
+    # pointers are set with one statement per table, reading the
+    # rows just inserted, rather than with CASE-based bulk updates
+    activity_type = ContentType.objects.get_for_model(activities[0])
+    Request.objects.filter(pk__in=[
+        request.pk for request in requests
+    ]).update(current_task=Subquery(Task.objects.filter(
+        request=OuterRef('pk'), sequence=1).values('pk')[:1]))
+    Task.objects.filter(pk__in=[task.pk for task in tasks]).update(
+        activity_type=activity_type,
+        activity_id=Subquery(type(activities[0]).objects.filter(
+            task=OuterRef('pk')).values('pk')[:1]))
+
+    for (request, task, activity) in zip(requests, tasks, activities):
+        request.current_task = task
+        task.activity_type = activity_type
+        task.activity_id = activity.id
+
+    return requests
+
+
+def initiate_requests(module, user, rows, chunk_size=BULK_CHUNK_SIZE):
+    """Initiates a workflow request for every valid initial activity
+    payload. Rows may be any iterable and are consumed chunk by chunk"""
+    config = flow_config(module)
+    model = config.activities[config.INITIAL].title
+    role = roles.resolve(config.activities[config.INITIAL].role)
+    result = BulkResult(created={}, errors={})
+
+    for chunk in chunked(rows, chunk_size):
+        valid = []
+        for (index, row) in chunk:
+            (form, formsets, errors) = validate(module, model, row)
+            if errors:
+                result.errors[index] = errors
+            else:
+                valid.append((index, (form, formsets)))
+
+        if not valid:
+            continue
+
+        try:
+            with transaction.atomic():
+                requests = persist(
+                    module, user, role, [row for (_, row) in valid])
+        except DatabaseError as error:
+            for (index, _) in valid:
+                result.errors[index] = {'__all__': [str(error)]}
+            continue
+
+        for ((index, _), request) in zip(valid, requests):
+            result.created[index] = request.id
+
+    return result
+
+
+def submit_tasks(module, user, identifiers, next_activity, groups=None):
+    """Submits the current tasks with the given ids to the next
+    activity in one transaction. Only tasks assigned to one of the
+    groups (default: the user's groups, any for superusers) are
+    submitted, provided the transition rule holds for their activity"""
+    config = flow_config(module)
+    identifiers = set(identifiers)
+    result = BulkResult(created={}, errors={})
+
+    if groups is None and not user.is_superuser:
+        groups = list(user.groups.values_list('id', flat=True))
+
+    with transaction.atomic():
+        tasks = Task.objects.filter(
+            id__in=identifiers,
+            request__module_ref=module,
+            request__current_task=F('pk')
+        ).select_related('request').select_for_update()
+        if groups is not None:
+            tasks = tasks.filter(assignee_id__in=groups)
+
+        candidates = []
+        for task in tasks.with_activities():
+            transitions = config.activities[task.activity_ref].transitions
+            if not task.activity:
+                error = 'Activity is not initiated'
+            elif not transitions or next_activity not in transitions:
+                error = 'Invalid transition'
+            else:
+                candidates.append(task)
+                continue
+            result.errors[task.id] = {'__all__': [error]}
+
+        # rules of all tasks evaluated in one batch
+        submitted = []
+        for (task, outcome) in zip(candidates, evaluate([(
+                task.activity, {next_activity: config.activities[
+                    task.activity_ref].transitions[next_activity]}
+        ) for task in candidates])):
+            if outcome[next_activity]:
+                submitted.append(task)
+            else:
+                result.errors[task.id] = {'__all__': [
+                    'Transition rule is not satisfied']}
+
+        for identifier in identifiers.difference(
+                task.id for task in submitted).difference(result.errors):
+            result.errors[identifier] = {'__all__': [
+                'Task is not assigned to you or no longer current']}
+
+        if not submitted:
+            return result
+
+        now = timezone.now()
+        role = roles.resolve(config.activities[next_activity].role)
+
+        Task.objects.filter(id__in=[task.id for task in submitted]).update(
+            status='Completed', last_updated=now)
+
+        created = bulk_insert(Task, [Task(
+            request_id=task.request_id,
+            sequence=task.sequence + 1,
+            assignee_id=role,
+            updated_by=user,
+            activity_ref=next_activity,
+            status='Not Started') for task in submitted])
+
+        Request.objects.filter(id__in=[
+            task.request_id for task in submitted
+        ]).update(last_updated=now, current_task=Subquery(
+            Task.objects.filter(request=OuterRef('pk')).order_by(
+                '-sequence').values('pk')[:1]))
+
+    invalidate([task.request_id for task in submitted])
+
+    for (task, new) in zip(submitted, created):
+        result.created[task.id] = new.id
+
+    return result
@@ -14,9 +14,28 @@ TASK_STATUS = (
     ('Rolled Back', 'Rolled Back'),
     ('Completed', 'Completed')
 )
+
+OPEN_TASK_STATUS = ('Not Started', 'In Progress')
+
 # register workflow apps here
 # enable 'tests' app only for manual testing purpose
 
 WORKFLOW_APPS = [
     'tests'
 ]
+
+# number of requests listed per page on workflow detail
+
+REQUESTS_PER_PAGE = 25
+
+# number of tasks listed per page on inbox
+
+TASKS_PER_PAGE = 50
+
+# number of rows written per transaction by bulk operations
+
+BULK_CHUNK_SIZE = 500
+
+# number of tasks fetched per round trip by exports
+
+EXPORT_CHUNK_SIZE = 2000
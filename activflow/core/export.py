@@ -0,0 +1,178 @@
+"""Streaming export of workflow requests
+
+Tasks of a workflow are read in request/sequence order with a
+server-side cursor (where the database supports it) and written out
+one record per task: request and task attributes followed by the
+activity fields configured for 'display' and its related items.
+Activities and related items are loaded per chunk of tasks, so memory
+stays bounded by the chunk size whatever the size of the tables.
+"""
+
+import csv
+import json
+import zlib
+from functools import lru_cache, partial
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import prefetch_related_objects
+
+from activflow.core.constants import EXPORT_CHUNK_SIZE
+from activflow.core.helpers import (
+    flow_config,
+    get_display_fields,
+    get_relations,
+    prefetch_relations
+)
+from activflow.core.models import Task
+
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+COLUMNS = (
+    'request_id',
+    'request_status',
+    'requester',
+    'request_created',
+    'request_updated',
+    'task_id',
+    'sequence',
+    'activity',
+    'task_status',
+    'assignee',
+    'task_created',
+    'task_updated',
+)
+
+
+@lru_cache(maxsize=None)
+def activity_fields(module, model):
+    """Returns (column, field) of the activity display fields and
+    (column, accessor, fields) of its related items"""
+    fields = tuple((
+        '{}.{}'.format(model.__name__, name), model._meta.get_field(name)
+    ) for (name, _) in get_display_fields(module, model, 'display'))
+
+    relations = tuple((
+        '{}.{}'.format(model.__name__, related.__name__),
+        accessor,
+        tuple((name, related._meta.get_field(name)) for (name, _) in (
+            get_display_fields(module, model, 'display', related)))
+    ) for (related, _, accessor) in get_relations(model))
+
+    return (fields, relations)
+
+
+def columns(module):
+    """Returns all columns of the workflow export"""
+    names = list(COLUMNS)
+    for activity in flow_config(module).activities.values():
+        (fields, relations) = activity_fields(module, activity.model)
+        names.extend(column for (column, _) in fields)
+        names.extend(column for (column, _, _) in relations)
+    return names
+
+
+def record(module, task):
+    """Returns export record of the task"""
+    request = task.request
+    data = {
+        'request_id': request.id,
+        'request_status': request.status,
+        'requester': request.requester.username,
+        'request_created': request.creation_date,
+        'request_updated': request.last_updated,
+        'task_id': task.id,
+        'sequence': task.sequence,
+        'activity': task.activity_ref,
+        'task_status': task.status,
+        'assignee': task.assignee.name,
+        'task_created': task.creation_date,
+        'task_updated': task.last_updated,
+    }
+
+    activity = task.activity
+    if activity:
+        (fields, relations) = activity_fields(module, type(activity))
+        for (column, field) in fields:
+            data[column] = field.value_from_object(activity)
+        for (column, accessor, related_fields) in relations:
+            data[column] = [{
+                name: field.value_from_object(item)
+                for (name, field) in related_fields
+            } for item in getattr(activity, accessor).all()]
+
+    return data
+
+
+def records(module, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields export records of all tasks of the workflow"""
+    tasks = Task.objects.filter(
+        request__module_ref=module
+    ).select_related(
+        'request__requester', 'assignee'
+    ).order_by('request_id', 'sequence').iterator(chunk_size=chunk_size)
+
+    while True:
+        chunk = list(islice(tasks, chunk_size))
+        if not chunk:
+            return
+
+        prefetch_related_objects(chunk, 'activity')
+        prefetch_relations(task.activity for task in chunk if task.activity)
+
+        for task in chunk:
+            yield record(module, task)
+
+
+class Echo(object):
+    """File-like object returning what is written to it"""
+    def write(self, value):
+        """Returns the value"""
+        return value
+
+
+def cell(value):
+    """Returns CSV representation of a value"""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, cls=DjangoJSONEncoder)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def write_ndjson(rows):
+    """Yields records as JSON lines"""
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def write_csv(module, rows):
+    """Yields header and records as CSV lines"""
+    writer = csv.DictWriter(Echo(), columns(module), restval='')
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow({
+            column: cell(value) for (column, value) in row.items()})
+
+
+def compress(chunks, level=6):
+    """Yields gzip compressed chunks"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(module, fmt='ndjson', gzip=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields the workflow export as encoded chunks"""
+    writer = {'ndjson': write_ndjson, 'csv': partial(write_csv, module)}[fmt]
+    chunks = (line.encode() for line in writer(
+        records(module, chunk_size)))
+
+    return compress(chunks) if gzip else chunks
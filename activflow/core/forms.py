@@ -0,0 +1,76 @@
+"""Forms"""
+
+from datetime import datetime, time, timedelta
+
+from django import forms
+from django.forms.models import BaseInlineFormSet
+from django.utils import timezone
+
+from activflow.core.constants import REQUEST_STATUS
+
+
+class RequestFilterForm(forms.Form):
+    """Filters for workflow requests listing"""
+    status = forms.ChoiceField(
+        choices=(('', 'Any'),) + REQUEST_STATUS, required=False)
+    requester = forms.CharField(max_length=150, required=False)
+    group = forms.CharField(
+        label='Assignee Group', max_length=150, required=False)
+    updated_from = forms.DateField(label='Updated From', required=False)
+    updated_to = forms.DateField(label='Updated To', required=False)
+
+    def clean_updated_from(self):
+        """Start of the day as aware datetime"""
+        date = self.cleaned_data['updated_from']
+        return timezone.make_aware(
+            datetime.combine(date, time.min)) if date else None
+
+    def clean_updated_to(self):
+        """Start of the following day as aware datetime
+        to make the date inclusive"""
+        date = self.cleaned_data['updated_to']
+        return timezone.make_aware(datetime.combine(
+            date + timedelta(days=1), time.min)) if date else None
+
+
+class ExistingObjectField(forms.ModelChoiceField):
+    """Primary key field of inline forms, resolving submitted keys
+    to the objects already loaded by the formset rather than with
+    a query per form"""
+    def __init__(self, lookup, *args, **kwargs):
+        """Initializes ExistingObjectField"""
+        super().__init__(*args, **kwargs)
+        self.lookup = lookup
+
+    def to_python(self, value):
+        """Returns the loaded object, querying for keys
+        outside of the formset's queryset"""
+        if value in self.empty_values:
+            return None
+        try:
+            obj = self.lookup(self.queryset.model._meta.pk.to_python(value))
+        except forms.ValidationError:
+            obj = None
+        return obj if obj is not None else super().to_python(value)
+
+
+class InlineFormSet(BaseInlineFormSet):
+    """Inline formset of activity relations"""
+    def existing_object(self, pk):
+        """Returns the object of the formset's (once evaluated)
+        queryset with the primary key, None if there is none"""
+        if not hasattr(self, 'existing_objects'):
+            self.existing_objects = {
+                obj.pk: obj for obj in self.get_queryset()}
+        return self.existing_objects.get(pk)
+
+    def add_fields(self, form, index):
+        """Adds fields, resolving primary keys of the
+        submitted rows through the formset's queryset"""
+        super().add_fields(form, index)
+        name = self.model._meta.pk.name
+        field = form.fields.get(name)
+        if type(field) is forms.ModelChoiceField:
+            form.fields[name] = ExistingObjectField(
+                self.existing_object, field.queryset,
+                initial=field.initial, required=False, widget=field.widget)
@@ -0,0 +1,118 @@
+"""Rendered fragment caching
+
+Rows of the workflow listing and entries of the request history are
+rendered once and reused from the cache configured through settings:
+
+    ACTIVFLOW_FRAGMENT_CACHE = 'default'  # alias in CACHES, None disables
+    ACTIVFLOW_FRAGMENT_TIMEOUT = 86400
+
+A fragment key combines the workflow request's generation with the
+ids/last updated timestamps of what the fragment shows and, for the
+listing, the user's permissions on its tasks. Saving or deleting a
+request, task or activity discards the generation of its request
+(``post_save``/``post_delete``), which orphans all of its fragments;
+writes bypassing signals are expected to call ``invalidate``.
+
+Fragments never contain per-user secrets such as CSRF tokens.
+"""
+
+import hashlib
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.safestring import mark_safe
+
+from activflow.core.models import AbstractActivity, Request, Task
+
+
+PREFIX = 'activflow:fragment'
+
+
+def get_cache():
+    """Returns the fragment cache, None if disabled"""
+    alias = getattr(settings, 'ACTIVFLOW_FRAGMENT_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def generation_key(identifier):
+    """Returns cache key of a workflow request's generation"""
+    return '{}:generation:{}'.format(PREFIX, identifier)
+
+
+def generations(cache, identifiers):
+    """Returns {request id: generation}, starting a new generation
+    for requests without one (never seen or invalidated)"""
+    keys = {identifier: generation_key(identifier) for identifier in (
+        identifiers)}
+    found = cache.get_many(keys.values())
+    missing = {key: uuid4().hex for key in keys.values() if (
+        key not in found)}
+
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+
+    return {identifier: found[key] for identifier, key in keys.items()}
+
+
+def invalidate(identifiers):
+    """Discards cached fragments of the workflow requests"""
+    cache = get_cache()
+    if cache is not None:
+        cache.delete_many([generation_key(identifier) for identifier in (
+            identifiers)])
+
+
+def render_cached(items, key, render):
+    """Sets ``fragment`` on each item, taken from the cache or
+    rendered along with the other misses by render(items), which
+    returns their fragments in order.
+
+    key(item) returns (request id, *parts), parts identifying
+    the content of the item's fragment.
+    """
+    if not items:
+        return
+
+    cache = get_cache()
+    if cache is None:
+        for (item, fragment) in zip(items, render(items)):
+            item.fragment = fragment
+        return
+
+    parts = [key(item) for item in items]
+    current = generations(cache, {part[0] for part in parts})
+    keys = ['{}:{}:{}:{}'.format(
+        PREFIX, part[0], current[part[0]], hashlib.md5(
+            repr(part[1:]).encode()).hexdigest()) for part in parts]
+    found = cache.get_many(keys)
+
+    misses = [index for index, name in enumerate(keys) if name not in found]
+    if misses:
+        rendered = render([items[index] for index in misses])
+        fresh = {keys[index]: str(fragment) for (index, fragment) in zip(
+            misses, rendered)}
+        cache.set_many(fresh, getattr(
+            settings, 'ACTIVFLOW_FRAGMENT_TIMEOUT', None))
+        found.update(fresh)
+
+    for (item, name) in zip(items, keys):
+        item.fragment = mark_safe(found[name])
+
+
+def invalidate_instance(sender, instance, **kwargs):
+    """Signal receiver, discards fragments showing the instance"""
+    if isinstance(instance, Request):
+        identifier = instance.pk
+    elif isinstance(instance, Task):
+        identifier = instance.request_id
+    elif isinstance(instance, AbstractActivity) and instance.task_id:
+        try:
+            identifier = instance.task.request_id
+        except Task.DoesNotExist:  # deleted along with the task
+            return
+    else:
+        return
+
+    invalidate([identifier])
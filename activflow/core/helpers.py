@@ -1,20 +1,26 @@
 """Helpers"""
 
-import inspect
-from importlib import import_module
+from collections import defaultdict
+from functools import lru_cache
 
 from django.apps import apps
+from django.db.models import prefetch_related_objects
 from django.forms import inlineformset_factory
 from django.forms.models import modelform_factory
 
+from activflow.core.forms import InlineFormSet
+from activflow.core.instrumentation import instrument
+from activflow.core.registry import registry
+
+
+OPERATIONS = ('create', 'update')
+
 
 # Configuration Loaders
 
 def workflow_config(module):
     """Returns workflow configuration"""
-    return import_module(
-        '{}.config'.format(
-            apps.get_app_config(module).name))
+    return registry.get(module)
 
 
 def activity_config(module, model):
@@ -25,8 +31,7 @@ def activity_config(module, model):
 
 def flow_config(module):
     """Returns flow configuration"""
-    return import_module(
-        '{}.flow'.format(apps.get_app_config(module).name))
+    return registry.get(module)
 
 
 def transition_config(module, activity):
@@ -34,7 +39,7 @@ def transition_config(module, activity):
     for a given workflow module and activity
     """
     return flow_config(
-        module).FLOW[activity]['transitions']
+        module).activities[activity].transitions
 
 
 def wysiwyg_config(module, activity):
@@ -84,17 +89,51 @@ def get_model_instance(**kwargs):
     return get_model(**kwargs).objects.get(id=kwargs.get("pk"))
 
 
-def get_fk(instances, **kwargs):
-    """Returns foreign key field"""
-    fields = []
-    model = get_model(**kwargs)
-    for field in instances[0]._meta.fields:
-        if field.get_internal_type() == 'ForeignKey':
-            fields.append(field)
+@lru_cache(maxsize=None)
+def get_relations(model):
+    """Returns (related model, foreign key name, accessor) of
+    models referencing the given model through a foreign key"""
+    return tuple((
+        relation.related_model,
+        relation.field.name,
+        relation.get_accessor_name()
+    ) for relation in model._meta.related_objects if relation.one_to_many)
+
+
+@lru_cache(maxsize=None)
+def get_display_fields(app, model, option, relation=None):
+    """Returns (name, verbose name) of the activity fields, or
+    of the related model fields, configured for the option"""
+    target = relation or model
+
+    try:
+        config = activity_config(app, model.__name__)
+        config = config['Relations'][
+            relation.__name__] if relation else config['Fields']
+        return tuple((
+            field, target._meta.get_field(field).verbose_name
+        ) for field in get_form_fields(option, config))
+    except KeyError:
+        exclude = ['id', 'task'] + [
+            fk for (related, fk, _) in get_relations(model) if (
+                related is relation)]
+        return tuple((
+            field.name, field.verbose_name
+        ) for field in target._meta.get_fields() if hasattr(
+            field, 'verbose_name') and field.name not in exclude)
+
 
-    for field in fields:
-        if field.related_model == model:
-            return field.name
+def prefetch_relations(activities):
+    """Loads related items of all given activities (None, for
+    missing activities, is skipped) with one query per related model"""
+    instances = defaultdict(list)
+    for activity in activities:
+        if activity is not None:
+            instances[type(activity)].append(activity)
+
+    for model, group in instances.items():
+        prefetch_related_objects(group, *[
+            accessor for (_, _, accessor) in get_relations(model)])
 
 
 # Form Helpers
@@ -102,11 +141,9 @@ def get_fk(instances, **kwargs):
 def get_custom_form(**kwargs):
     """Returns custom form instance"""
     try:
-        args = get_app_model_as_params(**kwargs)
-        config = form_config(*args)
-        return getattr(import_module(
-            '{}.forms'.format(apps.get_app_config(args[0]).name)), config)
-    except (AttributeError, KeyError):
+        (app, model) = get_app_model_as_params(**kwargs)
+        return workflow_config(app).forms[model]
+    except KeyError:
         return None
 
 
@@ -122,52 +159,72 @@ def get_form_fields(operation, field_config):
         operation in field_config[field])]
 
 
-def get_form(**kwargs):
-    """Returns form instance"""
-    callee = type(inspect.currentframe().f_back.f_locals['self']).__name__
-    operation = 'create' if 'Create' in callee else 'update'
-
+@instrument('forms.build_form')
+def build_form(app, model, operation):
+    """Returns a new form class"""
     try:
-        config = get_form_config('Fields', **kwargs)
+        config = activity_config(app, model)['Fields']
         fields = get_form_fields(operation, config)
     except KeyError:
         fields = [field for field in (
-            field.name for field in get_model(**kwargs)().class_meta.
-            get_fields()) if field not in [
-                'id', 'task', 'task_id', 'last_updated', 'creation_date']]
+            field.name for field in apps.get_model(
+                app, model)._meta.get_fields()) if field not in [
+                    'id', 'task', 'task_id', 'last_updated', 'creation_date']]
     arguments = {'fields': fields}
-    custom_form = get_custom_form(**kwargs)
+    custom_form = workflow_config(app).forms.get(model)
 
     if custom_form:
         arguments['form'] = custom_form
 
-    return modelform_factory(get_model(**kwargs), **arguments)
+    return modelform_factory(apps.get_model(app, model), **arguments)
 
 
-def get_formsets(what, extra=0, **kwargs):
-    """Returns a list of formset instances"""
+@instrument('forms.build_formsets')
+def build_formsets(app, model, operation, extra):
+    """Returns a tuple of new inline formset classes"""
     try:
-        related_fields = {}
-        relation_config = get_form_config('Relations', **kwargs)
-        operation = 'create' if 'Create' in what else 'update'
-
-        for relation in relation_config:
-            field_config = relation_config[relation]
-            related_fields[relation] = get_form_fields(operation, field_config)
-
-        def get_related_model(relation):
-            """Returns related model"""
-            args = get_app_model_as_params(**kwargs)
-            args.pop()
-            args.append(relation)
-
-            return apps.get_model(*args)
-
-        return [inlineformset_factory(
-            get_model(**kwargs),
-            get_related_model(relation),
-            fields=related_fields[relation],
-            extra=extra
-        ) for relation in related_fields]
+        relation_config = activity_config(app, model)['Relations']
     except KeyError:
-        return []
+        return ()
+
+    return tuple(inlineformset_factory(
+        apps.get_model(app, model),
+        apps.get_model(app, relation),
+        formset=InlineFormSet,
+        fields=get_form_fields(operation, relation_config[relation]),
+        extra=extra
+    ) for relation in relation_config)
+
+
+@lru_cache(maxsize=None)
+def form_class(app, model, operation):
+    """Returns form class, built once per (app, model, operation)"""
+    return build_form(app, model, operation)
+
+
+@lru_cache(maxsize=None)
+def formset_classes(app, model, operation, extra=0):
+    """Returns inline formset classes, built once per
+    (app, model, operation, extra)"""
+    return build_formsets(app, model, operation, extra)
+
+
+def warm_forms(module):
+    """Builds form and formset classes of all activities
+    of the workflow ahead of the first request"""
+    for activity in flow_config(module).activities.values():
+        for operation in OPERATIONS:
+            form_class(module, activity.title, operation)
+            for extra in (0, 1):
+                formset_classes(module, activity.title, operation, extra)
+
+
+def get_form(operation, **kwargs):
+    """Returns form class for the operation"""
+    return form_class(*get_app_model_as_params(**kwargs), operation)
+
+
+def get_formsets(operation, extra=0, **kwargs):
+    """Returns a list of formset classes for the operation"""
+    return list(formset_classes(
+        *get_app_model_as_params(**kwargs), operation, extra))
@@ -0,0 +1,262 @@
+"""Query count and latency instrumentation
+
+Enabled through settings:
+
+    ACTIVFLOW_METRICS = True        # aggregate, exposed at /metrics
+    ACTIVFLOW_SERVER_TIMING = True  # per-response Server-Timing header
+
+``MetricsMiddleware`` records, per view, the number of queries and the
+time spent in SQL, in template rendering and in Python (the rest).
+Engine operations decorated with ``instrument`` (task submission and
+rollback, rule evaluation, form construction, template tags) and each
+transition rule (``rule.<name>``) are timed as well. With both
+settings off the middleware removes itself and the decorated
+operations only pay for one attribute check.
+"""
+
+import threading
+from collections import defaultdict
+from contextlib import ExitStack
+from functools import wraps
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends import django as backend
+
+
+_local = threading.local()
+
+
+class Collector(object):
+    """Timings of the HTTP request being handled"""
+    def __init__(self):
+        """Initializes Collector"""
+        self.queries = 0
+        self.sql = 0.0
+        self.sql_in_template = 0.0
+        self.template = 0.0
+        self.depth = 0
+        self.operations = defaultdict(float)
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper"""
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = perf_counter() - start
+            self.queries += 1
+            self.sql += elapsed
+            if self.depth:
+                self.sql_in_template += elapsed
+
+    def python(self, total):
+        """Returns time spent outside SQL and template rendering"""
+        return total - self.sql - (self.template - self.sql_in_template)
+
+    def server_timing(self, total):
+        """Returns Server-Timing header value"""
+        entries = [
+            'db;dur={:.2f};desc="{} queries"'.format(
+                self.sql * 1000, self.queries),
+            'tpl;dur={:.2f}'.format(
+                (self.template - self.sql_in_template) * 1000),
+            'app;dur={:.2f}'.format(self.python(total) * 1000),
+        ] + [
+            '{};dur={:.2f}'.format(name, seconds * 1000)
+            for (name, seconds) in self.operations.items()
+        ]
+        return ', '.join(entries + ['total;dur={:.2f}'.format(total * 1000)])
+
+
+class Metrics(object):
+    """Aggregated view and operation timings"""
+    VIEW_METRICS = (
+        ('requests_total', 'Requests handled'),
+        ('queries_total', 'SQL queries issued'),
+        ('sql_seconds_total', 'Time spent in SQL'),
+        ('template_seconds_total', 'Time spent rendering templates'),
+        ('python_seconds_total', 'Time spent in Python'),
+        ('seconds_total', 'Time spent handling requests'),
+    )
+
+    def __init__(self):
+        """Initializes Metrics"""
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.views = defaultdict(lambda: [0, 0, 0.0, 0.0, 0.0, 0.0])
+        self.operations = defaultdict(lambda: [0, 0.0])
+
+    def observe_view(self, view, collector, total):
+        """Records timings of a handled request"""
+        with self.lock:
+            values = self.views[view]
+            values[0] += 1
+            values[1] += collector.queries
+            values[2] += collector.sql
+            values[3] += collector.template - collector.sql_in_template
+            values[4] += collector.python(total)
+            values[5] += total
+
+    def observe(self, operation, seconds):
+        """Records timing of an engine operation"""
+        with self.lock:
+            values = self.operations[operation]
+            values[0] += 1
+            values[1] += seconds
+
+    def clear(self):
+        """Discards recorded timings"""
+        with self.lock:
+            self.views.clear()
+            self.operations.clear()
+
+    def render(self):
+        """Returns metrics in Prometheus text format"""
+        with self.lock:
+            views = {view: list(values) for (view, values) in (
+                self.views.items())}
+            operations = {name: list(values) for (name, values) in (
+                self.operations.items())}
+
+        lines = []
+
+        def family(name, description, label, samples):
+            """Appends a counter with its samples"""
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} counter'.format(name))
+            for (value, sample) in sorted(samples.items()):
+                lines.append('{}{{{}="{}"}} {}'.format(
+                    name, label, escape(value), sample))
+
+        for (index, (suffix, description)) in enumerate(self.VIEW_METRICS):
+            family('activflow_view_' + suffix, description, 'view', {
+                view: values[index] for (view, values) in views.items()})
+
+        family('activflow_operation_calls_total', 'Engine operation calls',
+               'operation', {name: values[0] for (name, values) in (
+                   operations.items())})
+        family('activflow_operation_seconds_total',
+               'Time spent in engine operations', 'operation', {
+                   name: values[1] for (name, values) in (
+                       operations.items())})
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def escape(value):
+    """Escapes a Prometheus label value"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+def current():
+    """Returns collector of the HTTP request being handled"""
+    return getattr(_local, 'collector', None)
+
+
+def observe(name, seconds):
+    """Records timing of an engine operation, on the
+    aggregate and the current collector, when enabled"""
+    if not metrics.enabled:
+        return
+
+    metrics.observe(name, seconds)
+    collector = current()
+    if collector is not None:
+        collector.operations[name] += seconds
+
+
+def instrument(name):
+    """Decorator timing calls of an engine operation"""
+    def decorator(func):
+        """Wraps the operation"""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            """Times the call when instrumentation is enabled"""
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def timed_render(render):
+    """Wraps template rendering to time it on the current collector"""
+    @wraps(render)
+    def wrapper(self, *args, **kwargs):
+        """Times top level renders"""
+        collector = current()
+        if collector is None:
+            return render(self, *args, **kwargs)
+
+        start = perf_counter()
+        collector.depth += 1
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            collector.depth -= 1
+            if not collector.depth:
+                collector.template += perf_counter() - start
+    wrapper.timed = True
+    return wrapper
+
+
+def view_name(request):
+    """Returns name of the view which handled the request"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    return getattr(match.func, 'view_class', match.func).__name__
+
+
+class MetricsMiddleware(object):
+    """Records query counts and timings of every request"""
+    def __init__(self, get_response):
+        """Initializes MetricsMiddleware"""
+        self.get_response = get_response
+        self.metrics = getattr(settings, 'ACTIVFLOW_METRICS', False)
+        self.server_timing = getattr(
+            settings, 'ACTIVFLOW_SERVER_TIMING', False)
+
+        if not (self.metrics or self.server_timing):
+            raise MiddlewareNotUsed
+
+        metrics.enabled = True
+        if not getattr(backend.Template.render, 'timed', False):
+            backend.Template.render = timed_render(backend.Template.render)
+
+    def __call__(self, request):
+        """Handles the request with a fresh collector"""
+        collector = Collector()
+        _local.collector = collector
+        start = perf_counter()
+
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(collector))
+                response = self.get_response(request)
+        finally:
+            _local.collector = None
+
+        total = perf_counter() - start
+        view = view_name(request)
+
+        if self.metrics and view:
+            metrics.observe_view(view, collector, total)
+        if self.server_timing:
+            response['Server-Timing'] = collector.server_timing(total)
+
+        return response
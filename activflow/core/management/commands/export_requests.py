@@ -0,0 +1,43 @@
+"""Streaming export of workflow requests"""
+
+import sys
+
+from django.core.management.base import BaseCommand
+
+from activflow.core.constants import EXPORT_CHUNK_SIZE
+from activflow.core.export import FORMATS, export
+
+
+class Command(BaseCommand):
+    """Writes requests, tasks and activity data of a workflow
+    as NDJSON or CSV"""
+    help = 'Exports requests, tasks and activity data of a workflow'
+
+    def add_arguments(self, parser):
+        """Command arguments"""
+        parser.add_argument('app_name', help='workflow app label')
+        parser.add_argument(
+            '--format', choices=sorted(FORMATS), default='ndjson')
+        parser.add_argument(
+            '--gzip', action='store_true', help='compress output')
+        parser.add_argument(
+            '--output', default='-', help='output file, - for stdout')
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+            help='tasks fetched per round trip')
+
+    def handle(self, *args, **options):
+        """Command handler"""
+        path = options['output']
+        output = sys.stdout.buffer if path == '-' else open(path, 'wb')
+
+        try:
+            for chunk in export(
+                    options['app_name'], options['format'],
+                    options['gzip'], options['chunk_size']):
+                output.write(chunk)
+        finally:
+            if path == '-':
+                output.flush()
+            else:
+                output.close()
@@ -0,0 +1,82 @@
+"""Synthetic workflow data generation"""
+
+from timeit import default_timer
+
+from django.core.management.base import BaseCommand, CommandError
+
+from activflow.core.constants import WORKFLOW_APPS
+from activflow.core.synthetic import Generator
+
+
+def value_range(value):
+    """Parses 'min:max' (or a single number) into a tuple"""
+    try:
+        bounds = [int(bound) for bound in value.split(':')]
+    except ValueError:
+        bounds = []
+    if len(bounds) not in (1, 2) or bounds[0] > bounds[-1] or bounds[0] < 0:
+        raise ValueError('expected min:max, got {}'.format(value))
+    return (bounds[0], bounds[-1])
+
+
+def rate(value):
+    """Parses a probability"""
+    value = float(value)
+    if not 0 <= value <= 1:
+        raise ValueError('expected a probability, got {}'.format(value))
+    return value
+
+
+class Command(BaseCommand):
+    """Generates synthetic requests, task chains, activities and
+    inline rows of the registered workflows"""
+    help = 'Generates a deterministic synthetic workflow dataset'
+
+    def add_arguments(self, parser):
+        """Command arguments"""
+        parser.add_argument('requests', type=int, help='number of requests')
+        parser.add_argument(
+            '--apps', nargs='+', default=WORKFLOW_APPS,
+            help='workflow app labels (default: all registered)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--users', type=int, default=50, help='requesters/updaters')
+        parser.add_argument(
+            '--lines', type=value_range, default=(0, 5),
+            help='inline rows per relation of an activity, min:max')
+        parser.add_argument(
+            '--rollback-rate', type=rate, default=0.1,
+            help='probability that a step is rolled back')
+        parser.add_argument(
+            '--abandon-rate', type=rate, default=0.2,
+            help='probability that a request stops at a step')
+        parser.add_argument(
+            '--age', type=int, default=365,
+            help='days over which requests are spread')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='requests written per transaction')
+
+    def handle(self, *args, **options):
+        """Command handler"""
+        generator = Generator(
+            options['apps'],
+            seed=options['seed'],
+            users=options['users'],
+            lines=options['lines'],
+            rollback_rate=options['rollback_rate'],
+            abandon_rate=options['abandon_rate'],
+            age=options['age'],
+            batch_size=options['batch_size'])
+
+        start = default_timer()
+        try:
+            counts = generator.generate(options['requests'])
+        except ValueError as error:
+            raise CommandError(error)
+        elapsed = default_timer() - start
+
+        for (model, count) in counts.items():
+            self.stdout.write('{:>12} {}'.format(count, model._meta.label))
+        self.stdout.write('{:>12} rows in {:.1f}s'.format(
+            sum(counts.values()), elapsed))
@@ -0,0 +1,60 @@
+"""Bulk initiation of workflow requests"""
+
+import json
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from activflow.core.bulk import initiate_requests
+from activflow.core.constants import BULK_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    """Initiates workflow requests from a file of initial
+    activity payloads, one JSON object per line"""
+    help = 'Initiates workflow requests from a JSON lines file'
+
+    def add_arguments(self, parser):
+        """Command arguments"""
+        parser.add_argument('app_name', help='workflow app label')
+        parser.add_argument('path', help='JSON lines file, - for stdin')
+        parser.add_argument(
+            '--user', required=True, help='username of the requester')
+        parser.add_argument(
+            '--chunk-size', type=int, default=BULK_CHUNK_SIZE,
+            help='rows written per transaction')
+
+    @staticmethod
+    def read(lines):
+        """Yields payloads of non-blank lines"""
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+
+    def handle(self, *args, **options):
+        """Command handler"""
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError('Unknown user {}'.format(options['user']))
+
+        path = options['path']
+        lines = sys.stdin if path == '-' else open(path)
+
+        try:
+            result = initiate_requests(
+                options['app_name'], user, self.read(lines),
+                options['chunk_size'])
+        except ValueError as error:
+            raise CommandError('Malformed payload: {}'.format(error))
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+
+        for (index, errors) in sorted(result.errors.items()):
+            self.stderr.write('row {}: {}'.format(
+                index + 1, json.dumps(errors)))
+
+        self.stdout.write('{} requests initiated, {} rows rejected'.format(
+            len(result.created), len(result.errors)))
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.15 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['module_ref', '-last_updated', '-id'], name='request_module_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['module_ref', 'status', '-last_updated', '-id'], name='request_status_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['requester', 'module_ref', '-last_updated', '-id'], name='request_requester_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['request', 'assignee'], name='task_request_assignee_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.15 on 2026-10-18 11:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def number_tasks(apps, schema_editor):
+    """Numbers existing tasks per request in creation order
+    and points each request to its most recent task"""
+    Task = apps.get_model('core', 'Task')
+    Request = apps.get_model('core', 'Request')
+
+    (tasks, requests) = ([], [])
+    (request_id, sequence) = (None, 0)
+
+    for task in Task.objects.order_by('request_id', 'id').only(
+            'id', 'request_id').iterator():
+        if task.request_id != request_id:
+            if request_id is not None:
+                requests.append(Request(id=request_id, current_task_id=last))
+            (request_id, sequence) = (task.request_id, 0)
+        sequence += 1
+        last = task.id
+        task.sequence = sequence
+        tasks.append(task)
+
+    if request_id is not None:
+        requests.append(Request(id=request_id, current_task_id=last))
+
+    Task.objects.bulk_update(tasks, ['sequence'], batch_size=500)
+    Request.objects.bulk_update(requests, ['current_task'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_request_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='request',
+            name='current_task',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.task'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='sequence',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(number_tasks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(fields=('request', 'sequence'), name='task_request_sequence_uniq'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.15 on 2026-10-18 11:10
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_activities(apps, schema_editor):
+    """Points existing tasks to their activities"""
+    Task = apps.get_model('core', 'Task')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    for model in apps.get_models():
+        try:
+            field = model._meta.get_field('task')
+        except FieldDoesNotExist:
+            continue
+
+        if not field.one_to_one or field.related_model is not Task:
+            continue
+
+        content_type = ContentType.objects.get_for_model(model)
+        tasks = [Task(
+            id=task_id,
+            activity_type_id=content_type.id,
+            activity_id=activity_id
+        ) for (activity_id, task_id) in model.objects.filter(
+            task__isnull=False).values_list('id', 'task_id').iterator()]
+
+        Task.objects.bulk_update(
+            tasks, ['activity_type', 'activity_id'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('core', '0003_current_task_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='activity_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='activity_type',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='contenttypes.contenttype'),
+        ),
+        migrations.RunPython(link_activities, migrations.RunPython.noop),
+    ]
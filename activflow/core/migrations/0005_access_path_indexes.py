@@ -0,0 +1,42 @@
+# Generated by Django 3.2.15 on 2026-10-18 11:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('auth', '0007_alter_validators_add_error_messages'),
+        ('core', '0004_task_activity_pointer'),
+    ]
+
+    operations = [
+        # composite indexes are created before the single column
+        # foreign key indexes they supersede are dropped
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['request', 'id'], name='task_request_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['assignee', 'status', '-last_updated', '-id'], name='task_assignee_status_idx'),
+        ),
+        migrations.AlterField(
+            model_name='request',
+            name='requester',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='requests', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='assignee',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='auth.group'),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='request',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='core.request'),
+        ),
+    ]
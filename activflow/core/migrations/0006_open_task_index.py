@@ -0,0 +1,17 @@
+# Generated by Django 3.2.15 on 2026-10-18 11:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status__in', ('Not Started', 'In Progress'))), fields=['assignee', '-last_updated', '-id'], name='task_open_assignee_idx'),
+        ),
+    ]
@@ -1,21 +1,39 @@
 """Model definition for workflow operations"""
 
 from django.contrib.auth.models import User, Group
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
 from django.db.models import (
     Model,
+    QuerySet,
     CharField,
     DateTimeField,
     OneToOneField,
     ForeignKey,
-    CASCADE)
+    PositiveIntegerField,
+    Exists,
+    Index,
+    Max,
+    OuterRef,
+    Prefetch,
+    Q,
+    UniqueConstraint,
+    CASCADE,
+    SET_NULL)
 
 from activflow.core.constants import (
+    OPEN_TASK_STATUS,
     REQUEST_STATUS,
-    TASK_STATUS)
+    TASK_STATUS,
+    WORKFLOW_APPS)
 
 from activflow.core.helpers import (
     flow_config,
     transition_config)
+from activflow.core.instrumentation import instrument
+from activflow.core.roles import roles
+from activflow.core.rules import evaluate
 
 
 class AbstractEntity(Model):
@@ -56,32 +74,93 @@ class AbstractEntity(Model):
 
 class Request(AbstractEntity):
     """Defines the workflow request"""
-    requester = ForeignKey(User, related_name='requests', on_delete=CASCADE)
+    # indexed through the composite indexes below
+    requester = ForeignKey(
+        User, related_name='requests', on_delete=CASCADE, db_index=False)
     module_ref = CharField(max_length=100)
     status = CharField(
         verbose_name="Status", max_length=30, choices=REQUEST_STATUS)
+    current_task = ForeignKey(
+        'Task', null=True, blank=True, related_name='+', on_delete=SET_NULL)
+
+    class Meta(object):
+        indexes = [
+            Index(
+                fields=['module_ref', '-last_updated', '-id'],
+                name='request_module_updated_idx'),
+            Index(
+                fields=['module_ref', 'status', '-last_updated', '-id'],
+                name='request_status_updated_idx'),
+            Index(
+                fields=['requester', 'module_ref', '-last_updated', '-id'],
+                name='request_requester_updated_idx'),
+        ]
+
+    def append_task(self, **kwargs):
+        """Creates the next task in sequence and makes it the
+        current task. Callers are expected to run it atomically"""
+        sequence = self.tasks.aggregate(last=Max('sequence'))['last'] or 0
+        task = Task.objects.create(
+            request=self, sequence=sequence + 1, **kwargs)
+
+        self.current_task = task
+        self.save(update_fields=['current_task', 'last_updated'])
+
+        return task
+
+
+class TaskQuerySet(QuerySet):
+    """Task queryset"""
+    def with_activities(self):
+        """Loads activities of the tasks with one query
+        per activity model"""
+        return self.prefetch_related('activity')
 
 
 class Task(AbstractEntity):
     """Defines the workflow task"""
-    request = ForeignKey(Request, related_name='tasks', on_delete=CASCADE)
-    assignee = ForeignKey(Group, on_delete=CASCADE)
+    # indexed through the composite indexes below
+    request = ForeignKey(
+        Request, related_name='tasks', on_delete=CASCADE, db_index=False)
+    assignee = ForeignKey(Group, on_delete=CASCADE, db_index=False)
     updated_by = ForeignKey(User, on_delete=CASCADE)
     activity_ref = CharField(max_length=100)
     status = CharField(
         verbose_name="Status", max_length=30, choices=TASK_STATUS)
+    sequence = PositiveIntegerField(default=1)
+    activity_type = ForeignKey(
+        ContentType, null=True, blank=True, on_delete=SET_NULL)
+    activity_id = PositiveIntegerField(null=True, blank=True)
+    activity = GenericForeignKey('activity_type', 'activity_id')
 
-    @property
-    def activity(self):
-        """Returns the activity associated with the task"""
-        flow = flow_config(self.request.module_ref).FLOW
-        return getattr(
-            self, flow[self.activity_ref]['model']().title.lower(), None)
+    objects = TaskQuerySet.as_manager()
+
+    class Meta(object):
+        indexes = [
+            Index(
+                fields=['request', 'assignee'],
+                name='task_request_assignee_idx'),
+            Index(
+                fields=['request', 'id'],
+                name='task_request_id_idx'),
+            Index(
+                fields=['assignee', 'status', '-last_updated', '-id'],
+                name='task_assignee_status_idx'),
+            Index(
+                fields=['assignee', '-last_updated', '-id'],
+                condition=Q(status__in=OPEN_TASK_STATUS),
+                name='task_open_assignee_idx'),
+        ]
+        constraints = [
+            UniqueConstraint(
+                fields=['request', 'sequence'],
+                name='task_request_sequence_uniq'),
+        ]
 
     @property
     def is_active(self):
         """Checks if the current task is active / most recent"""
-        return self == self.request.tasks.latest('id')
+        return self.id == self.request.current_task_id
 
     @property
     def is_final(self):
@@ -94,8 +173,8 @@ class Task(AbstractEntity):
     @property
     def previous(self):
         """Returns previous task"""
-        return Task.objects.filter(
-            request=self.request, id__lt=self.id).latest('id')
+        return Task.objects.get(
+            request_id=self.request_id, sequence=self.sequence - 1)
 
     @property
     def can_view_activity(self):
@@ -116,28 +195,32 @@ class Task(AbstractEntity):
     def can_rollback(self):
         """Checks if activity can be rolled back"""
         return not any([
-            self.activity.is_initial,
+            self.activity_ref == flow_config(self.request.module_ref).INITIAL,
             self.status == 'Completed'])
 
+    def link(self, activity):
+        """Points the task to its (saved) activity"""
+        self.activity = activity
+        self.save(update_fields=['activity_type', 'activity_id'])
+
     def initiate(self):
         """Initializes the task"""
         self.status = 'In Progress'
         self.save()
 
+    @instrument('task.submit')
+    @transaction.atomic
     def submit(self, module, user, next_activity=None):
         """Submits the task"""
-        config = flow_config(module)
         transitions = transition_config(module, self.activity_ref)
-        role = Group.objects.get(
-            name=config.FLOW[next_activity]['role'])
 
         self.status = 'Completed'
         self.save()
 
         if transitions is not None:
-            Task.objects.create(
-                request=self.request,
-                assignee=role,
+            self.request.append_task(
+                assignee_id=roles.resolve(flow_config(
+                    module).activities[next_activity].role),
                 updated_by=user,
                 activity_ref=next_activity,
                 status='Not Started')
@@ -145,6 +228,8 @@ class Task(AbstractEntity):
             self.request.status = 'Completed'
             self.request.save()
 
+    @instrument('task.rollback')
+    @transaction.atomic
     def rollback(self):
         """Rollback to previous task"""
         previous = self.previous
@@ -154,16 +239,18 @@ class Task(AbstractEntity):
         self.save()
 
         # Clone Task
-        task = self.previous
-        task.id = None
-        task.status = 'Not Started'
-        task.save()
+        task = self.request.append_task(
+            assignee_id=previous.assignee_id,
+            updated_by_id=previous.updated_by_id,
+            activity_ref=previous.activity_ref,
+            status='Not Started')
 
         # Clone Activity
-        activity = self.previous.activity
+        activity = previous.activity
         activity.id = None
         activity.task = task
         activity.save()
+        task.link(activity)
 
 
 class AbstractActivity(AbstractEntity):
@@ -177,30 +264,35 @@ class AbstractActivity(AbstractEntity):
     def is_initial(self):
         """Checks if the activity is initial activity"""
         config = flow_config(self.module_label)
-        return True if self.title == config.FLOW[
-            config.INITIAL]['model']().title else False
+        return self.title == config.activities[config.INITIAL].title
 
+    @instrument('rules.next_activity')
     def next_activity(self):
         """Compute the next possible activities"""
         transitions = transition_config(
             self.module_label, self.task.activity_ref)
+        if not transitions:
+            return None
 
+        results = evaluate([(self, transitions)])[0]
         return [transition for transition in
-                transitions if transitions[transition](
-                    self)] if transitions else None
+                transitions if results[transition]]
 
+    @instrument('rules.validate')
     def validate_rule(self, identifier):
         """Validates the rule for the current
         transition"""
         transitions = transition_config(
             self.module_label, self.task.activity_ref)
 
-        return transitions[identifier](self)
+        return evaluate([(self, {
+            identifier: transitions[identifier]})])[0][identifier]
 
     def assign_task(self, identifier):
         """Link activity with task"""
         self.task = Task.objects.get(id=identifier)
         self.save()
+        self.task.link(self)
 
     def update(self):
         """On activity save"""
@@ -222,33 +314,78 @@ class AbstractInitialActivity(AbstractActivity):
     class Meta(object):
         abstract = True
 
+    @transaction.atomic
     def initiate_request(self, user, module):
         """Initiates new workflow requests"""
         config = flow_config(self.module_label)
-        role = Group.objects.get(
-            name=config.FLOW[config.INITIAL]['role'])
 
         request = Request.objects.create(
             requester=user,
             module_ref=module,
             status='Initiated')
 
-        task = Task.objects.create(
-            request=request,
-            assignee=role,
+        task = request.append_task(
+            assignee_id=roles.resolve(
+                config.activities[config.INITIAL].role),
             updated_by=user,
             activity_ref=config.INITIAL,
             status='In Progress')
 
         self.task = task
         self.save()
-
-
-def get_workflows_requests(module):
-    """Returns all requests for specified workflow"""
-    return Request.objects.filter(module_ref=module)
+        task.link(self)
+
+
+def get_workflows_requests(module, status=None, requester=None, group=None,
+                           updated_from=None, updated_to=None):
+    """Returns requests for specified workflow, along with
+    requester, tasks and assignees (activities are left to
+    be loaded for the rows not rendered from cache)"""
+    tasks = Task.objects.select_related('assignee').order_by('sequence')
+    requests = Request.objects.filter(module_ref=module)
+
+    if status:
+        requests = requests.filter(status=status)
+    if requester:
+        requests = requests.filter(requester__username=requester)
+    if group:
+        requests = requests.filter(Exists(Task.objects.filter(
+            request=OuterRef('pk'), assignee__name=group)))
+    if updated_from:
+        requests = requests.filter(last_updated__gte=updated_from)
+    if updated_to:
+        requests = requests.filter(last_updated__lt=updated_to)
+
+    return requests.select_related(
+        'requester'
+    ).prefetch_related(
+        Prefetch('tasks', queryset=tasks)
+    ).order_by('-last_updated', '-id')
+
+
+def get_inbox_tasks(groups):
+    """Returns open tasks assigned to any of the groups
+    across all registered workflows"""
+    return Task.objects.filter(
+        assignee_id__in=groups,
+        status__in=OPEN_TASK_STATUS,
+        request__module_ref__in=WORKFLOW_APPS
+    ).select_related(
+        'request__requester', 'assignee'
+    ).with_activities()
 
 
 def get_task(identifier):
     """Returns task instance"""
     return Task.objects.get(id=identifier)
+
+
+def unlink_activity(sender, instance, **kwargs):
+    """Signal receiver, clears the pointer of the deleted activity's
+    task so that the task can be initiated again"""
+    if instance.task_id:
+        Task.objects.filter(
+            id=instance.task_id,
+            activity_type=ContentType.objects.get_for_model(sender),
+            activity_id=instance.pk
+        ).update(activity_type=None, activity_id=None)
@@ -0,0 +1,61 @@
+"""Keyset (cursor) pagination"""
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from collections import namedtuple
+
+from django.utils.dateparse import parse_datetime
+
+
+Page = namedtuple('Page', ['object_list', 'next_cursor'])
+
+
+def encode_cursor(instance):
+    """Returns cursor pointing past the given instance"""
+    position = '{}|{}'.format(
+        instance.last_updated.isoformat(), instance.id)
+    return urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns (last_updated, id) position of the cursor
+    or None if the cursor is malformed"""
+    try:
+        (last_updated, identifier) = urlsafe_b64decode(
+            cursor.encode()).decode().split('|')
+        return (parse_datetime(last_updated), int(identifier))
+    except (DecodeError, UnicodeDecodeError, TypeError, ValueError):
+        return None
+
+
+def seek(queryset, cursor=None):
+    """Returns the queryset ordered by (last_updated, id), newest
+    first, starting after the cursor position.
+
+    The position is applied as a range condition on the leading
+    ordering column so that the database seeks straight to the
+    page in the (..., last_updated, id) indexes instead of
+    counting over preceding rows as OFFSET does.
+    """
+    queryset = queryset.order_by('-last_updated', '-id')
+    position = decode_cursor(cursor) if cursor else None
+
+    if position and position[0]:
+        (last_updated, identifier) = position
+        queryset = queryset.filter(
+            last_updated__lte=last_updated
+        ).exclude(
+            last_updated=last_updated, id__gte=identifier)
+
+    return queryset
+
+
+def paginate(queryset, cursor=None, size=25):
+    """Returns a page of the queryset ordered by (last_updated, id),
+    newest first, starting after the cursor position"""
+    items = list(seek(queryset, cursor)[:size + 1])
+
+    return Page(
+        object_list=items[:size],
+        next_cursor=encode_cursor(items[size - 1]) if (
+            len(items) > size) else None)
@@ -0,0 +1,162 @@
+"""Permission checks
+
+All checks are scoped to a single activity/task (or the tasks of
+a page) and work on the user's group IDs, which are kept in the
+session and reused until the user's group memberships change (or
+any group is saved or deleted), as tracked by versions in the cache
+shared by all processes (see activflow.core.roles).
+"""
+
+from collections import namedtuple
+
+from django.db.models import F, Q
+
+from activflow.core.constants import REQUEST_IDENTIFIER
+from activflow.core.helpers import flow_config
+from activflow.core.models import Task
+from activflow.core.roles import get_cache, get_versions
+
+
+TaskPermissions = namedtuple(
+    'TaskPermissions', ['view', 'initiate', 'revise', 'rollback'])
+
+
+GROUPS_SESSION_KEY = '_activflow_groups'
+
+GROUPS_VERSION_KEY = 'activflow:groups:{}'
+
+
+def get_groups_version(user_id):
+    """Returns version of the user's groups, starting new
+    versions for those missing from the cache"""
+    keys = [GROUPS_VERSION_KEY.format(user_id), GROUPS_VERSION_KEY.format(
+        'all')]
+    found = get_versions(keys)
+    return ':'.join(found[key] for key in keys)
+
+
+def invalidate_groups(user_ids=None):
+    """Discards the groups of the users (all users if None)
+    kept in their sessions"""
+    get_cache().delete_many([GROUPS_VERSION_KEY.format(
+        user_id) for user_id in (user_ids if user_ids is not None else [
+            'all'])])
+
+
+def load_groups(session, user):
+    """Returns {id: name} of the user's groups, as kept in the
+    session if still current, otherwise loaded and kept"""
+    version = get_groups_version(user.pk)
+    stored = session.get(GROUPS_SESSION_KEY) if session is not None else None
+
+    if stored and stored['version'] == version:
+        return {identifier: name for (identifier, name) in stored['groups']}
+
+    groups = dict(user.groups.values_list('id', 'name'))
+    if session is not None:
+        session[GROUPS_SESSION_KEY] = {
+            'version': version, 'groups': list(groups.items())}
+
+    return groups
+
+
+def get_user_groups(request):
+    """Returns {id: name} of the logged-in user's groups, loaded
+    once per session and version of the user's groups"""
+    try:
+        return request.activflow_groups
+    except AttributeError:
+        request.activflow_groups = load_groups(
+            getattr(request, 'session', None), request.user)
+        return request.activflow_groups
+
+
+def logged_in(sender, request, user, **kwargs):
+    """Signal receiver (user_logged_in), keeps the user's groups
+    in the session being written for the login anyway"""
+    load_groups(getattr(request, 'session', None), user)
+
+
+def membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Signal receiver (m2m_changed of user groups)"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        invalidate_groups([instance.pk])
+    elif pk_set:
+        invalidate_groups(pk_set)
+    else:  # group cleared of its users
+        invalidate_groups()
+
+
+def group_changed(sender, **kwargs):
+    """Signal receiver (post_save/post_delete of groups)"""
+    invalidate_groups()
+
+
+def is_identifier(value):
+    """Checks if the value can be used as primary key"""
+    return str(value).isdigit()
+
+
+def can_view(request, model, identifier):
+    """Checks if the user is assignee of the activity's task
+    or requester of its workflow request"""
+    return is_identifier(identifier) and model.objects.filter(
+        Q(task__assignee_id__in=get_user_groups(request)) |
+        Q(task__request__requester=request.user),
+        pk=identifier
+    ).exists()
+
+
+def can_update(request, model, identifier):
+    """Checks if the user is assignee of the activity's task
+    and the task is the current task of the request"""
+    return is_identifier(identifier) and model.objects.filter(
+        pk=identifier,
+        task__assignee_id__in=get_user_groups(request),
+        task__request__current_task=F('task')
+    ).exists()
+
+
+def can_create(request, module, identifier):
+    """Checks if the user plays the role configured for the
+    activity to be initiated"""
+    config = flow_config(module)
+
+    if identifier == REQUEST_IDENTIFIER:
+        activity = config.INITIAL
+    else:
+        activity = Task.objects.values_list(
+            'activity_ref', flat=True).get(id=identifier)
+
+    return config.activities[activity].role in get_user_groups(
+        request).values()
+
+
+def get_task_permissions(request, tasks):
+    """Returns {task id: TaskPermissions} for the given tasks.
+
+    Works entirely on columns already loaded with the tasks (request,
+    activity pointer, current task pointer), so a whole page of tasks
+    costs at most the one query loading the user's groups.
+    """
+    user = request.user
+    groups = {} if user.is_superuser else get_user_groups(request)
+    roles = set(groups.values())
+    permissions = {}
+
+    for task in tasks:
+        activity = task.activity_id is not None
+        is_assignee = user.is_superuser or task.assignee_id in groups
+        permissions[task.id] = TaskPermissions(
+            view=activity and (
+                is_assignee or task.request.requester_id == user.id),
+            initiate=not activity and (user.is_superuser or flow_config(
+                task.request.module_ref).activities[
+                    task.activity_ref].role in roles),
+            revise=activity and task.is_active and is_assignee,
+            rollback=activity and is_assignee and task.can_rollback)
+
+    return permissions
@@ -1,31 +1,27 @@
 """Common template processors"""
 
-from activflow.core.helpers import (
-    get_request_params,
-    flow_config
-)
+from activflow.core.helpers import flow_config
 
 
 def global_context(request):
     """Sets up global template context"""
-    def get_value(key):
-        """Returns value against specified key"""
-        return get_request_params(key, request)
+    match = request.resolver_match
+    kwargs = match.kwargs if match else {}
 
-    app_title = get_value('app_name')
-    activity_identifier = get_value('model_name')
+    app_title = kwargs.get('app_name')
+    activity_identifier = kwargs.get('model_name')
+    activity_title = None
 
-    try:
-        flow = flow_config(app_title).FLOW
-        activity_title = flow[
-            [identifier for identifier in flow if flow[identifier][
-                'model']().title == activity_identifier][0]]['name']
-    except (IndexError, LookupError, ImportError):
-        activity_title = None
+    if app_title:
+        try:
+            activity_title = flow_config(
+                app_title).names.get(activity_identifier)
+        except (LookupError, ImportError):
+            pass
 
     return {
         'entity_title': activity_identifier,
         'app_title': app_title,
-        'identifier': get_value('pk'),
+        'identifier': kwargs.get('pk'),
         'activity_title': activity_title
     }
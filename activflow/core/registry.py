@@ -0,0 +1,128 @@
+"""Compiled workflow registry"""
+
+from collections import namedtuple
+from importlib import import_module
+from types import MappingProxyType
+
+from django.apps import apps
+from django.utils.module_loading import module_has_submodule
+
+
+EMPTY = MappingProxyType({})
+
+
+Activity = namedtuple('Activity', [
+    'ref',          # identifier of the activity in FLOW
+    'name',         # friendly name
+    'model',        # activity model class
+    'title',        # activity model name
+    'role',         # role (group name) the activity is assigned to
+    'transitions',  # read-only mapping of next activity -> rule or None
+    'accessor'      # reverse accessor of the activity on Task
+])
+
+
+Workflow = namedtuple('Workflow', [
+    'label',            # app label
+    'FLOW',
+    'INITIAL',
+    'TITLE',
+    'DESCRIPTION',
+    'ACTIVITY_CONFIG',
+    'WYSIWYG_CONFIG',
+    'FORM_CONFIG',
+    'activities',       # activity ref -> Activity
+    'refs',             # activity model name -> activity ref
+    'names',            # activity model name -> activity friendly name
+    'forms'             # activity model name -> custom form class
+])
+
+
+def freeze(value):
+    """Returns a read-only copy of nested dictionaries/lists"""
+    if isinstance(value, dict):
+        return MappingProxyType(
+            {key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def load_submodule(app, name):
+    """Imports the submodule of a workflow app, if it exists"""
+    if module_has_submodule(app.module, name):
+        return import_module('{}.{}'.format(app.name, name))
+    return None
+
+
+def compile_workflow(label):
+    """Compiles flow and configuration of a workflow app"""
+    app = apps.get_app_config(label)
+    flow = import_module('{}.flow'.format(app.name))
+    config = load_submodule(app, 'config')
+
+    activities = {}
+    for ref, definition in flow.FLOW.items():
+        model = definition['model']
+        transitions = definition['transitions']
+        activities[ref] = Activity(
+            ref=ref,
+            name=definition['name'],
+            model=model,
+            title=model.__name__,
+            role=definition['role'],
+            transitions=MappingProxyType(
+                dict(transitions)) if transitions is not None else None,
+            accessor=model._meta.get_field(
+                'task').remote_field.get_accessor_name())
+
+    form_config = freeze(getattr(config, 'FORM_CONFIG', {}))
+    forms_module = load_submodule(app, 'forms') if form_config else None
+    forms = {model: getattr(forms_module, form) for model, form in (
+        form_config.items()) if hasattr(forms_module, form)}
+
+    return Workflow(
+        label=label,
+        FLOW=freeze(flow.FLOW),
+        INITIAL=flow.INITIAL,
+        TITLE=getattr(flow, 'TITLE', label),
+        DESCRIPTION=getattr(flow, 'DESCRIPTION', ''),
+        ACTIVITY_CONFIG=freeze(getattr(config, 'ACTIVITY_CONFIG', {})),
+        WYSIWYG_CONFIG=freeze(getattr(config, 'WYSIWYG_CONFIG', {})),
+        FORM_CONFIG=form_config,
+        activities=MappingProxyType(activities),
+        refs=MappingProxyType({
+            activity.title: ref for ref, activity in activities.items()}),
+        names=MappingProxyType({
+            activity.title: activity.name for activity in (
+                activities.values())}),
+        forms=MappingProxyType(forms))
+
+
+class Registry(object):
+    """Holds compiled workflows, indexed by app label"""
+    def __init__(self):
+        """Initializes Registry"""
+        self.workflows = {}
+
+    def populate(self, labels):
+        """Compiles workflows for the given app labels"""
+        for label in labels:
+            self.workflows[label] = compile_workflow(label)
+
+    def get(self, label):
+        """Returns compiled workflow, compiling it on first use
+        if the app was not registered at startup"""
+        try:
+            return self.workflows[label]
+        except KeyError:
+            workflow = compile_workflow(label)
+            self.workflows[label] = workflow
+            return workflow
+
+    def clear(self):
+        """Discards all compiled workflows"""
+        self.workflows.clear()
+
+
+registry = Registry()
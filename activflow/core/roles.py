@@ -0,0 +1,116 @@
+"""Role resolution
+
+Roles of the compiled flows are resolved to Group primary keys once
+per process and kept until a Group is saved or deleted.
+
+Processes share the invalidation of resolved roles and of the user
+groups kept in sessions through versions held in a cache, which must
+be shared by all processes (e.g. memcached or redis) for changes made
+in one process to be seen by the others at once. Versions expire after
+a timeout, bounding how long a process may rely on stale groups when
+the cache is not shared (None: until invalidated, shared cache only):
+
+    ACTIVFLOW_GROUPS_CACHE = 'default'  # alias in CACHES
+    ACTIVFLOW_GROUPS_TIMEOUT = 60       # seconds
+"""
+
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core import checks
+from django.core.cache import caches
+
+from activflow.core.registry import registry
+
+
+ROLES_VERSION_KEY = 'activflow:roles'
+
+# cache backends which are not shared by processes
+LOCAL_CACHES = (
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+def get_cache():
+    """Returns the cache holding versions of roles and user groups"""
+    return caches[getattr(settings, 'ACTIVFLOW_GROUPS_CACHE', 'default')]
+
+
+def get_versions(keys):
+    """Returns {key: version} of the keys, starting new versions,
+    valid for ACTIVFLOW_GROUPS_TIMEOUT, for those missing"""
+    cache = get_cache()
+    found = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in found}
+
+    if missing:
+        cache.set_many(missing, getattr(
+            settings, 'ACTIVFLOW_GROUPS_TIMEOUT', 60))
+        found.update(missing)
+
+    return found
+
+
+class RoleCache(object):
+    """Group ids of roles, by group name"""
+    def __init__(self):
+        """Initializes RoleCache"""
+        self.ids = {}
+        self.version = None
+
+    def resolve(self, role):
+        """Returns id of the group playing the role, resolving
+        the roles of all compiled workflows on first use (and
+        once the shared version changed or expired)"""
+        version = get_versions([ROLES_VERSION_KEY])[ROLES_VERSION_KEY]
+        if version != self.version:
+            self.ids.clear()
+            self.version = version
+
+        try:
+            return self.ids[role]
+        except KeyError:
+            pass
+
+        roles = {activity.role for workflow in registry.workflows.values()
+                 for activity in workflow.activities.values()}
+        roles.add(role)
+        self.ids.update(Group.objects.filter(
+            name__in=roles).values_list('name', 'id'))
+
+        try:
+            return self.ids[role]
+        except KeyError:
+            raise Group.DoesNotExist(
+                'No group plays the role {}'.format(role))
+
+    def clear(self):
+        """Discards resolved roles, in all processes"""
+        self.ids.clear()
+        get_cache().delete(ROLES_VERSION_KEY)
+
+
+roles = RoleCache()
+
+
+def clear_roles(sender, **kwargs):
+    """Signal receiver, discards resolved roles on group changes"""
+    roles.clear()
+
+
+def check_groups_cache(app_configs, **kwargs):
+    """System check, warns when versions of roles and user groups
+    never expire while held in a cache local to the process"""
+    alias = getattr(settings, 'ACTIVFLOW_GROUPS_CACHE', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+
+    if getattr(settings, 'ACTIVFLOW_GROUPS_TIMEOUT', 60) is None and (
+            backend in LOCAL_CACHES):
+        return [checks.Warning(
+            'Group changes are not seen by other processes',
+            hint='Set ACTIVFLOW_GROUPS_CACHE to a cache shared by all '
+                 'processes, or set ACTIVFLOW_GROUPS_TIMEOUT',
+            id='activflow.W001')]
+    return []
@@ -0,0 +1,391 @@
+"""Transition rule evaluation
+
+Transition rules are callables taking the activity. Rules declare
+the activity fields and relations they read with ``depends_on``:
+
+    @depends_on(fields=['bar'], relations=['lines'])
+    def foo_to_corge(self):
+        return self.bar != 'Sample' and len(self.lines.all()) > 0
+
+Results are memoized per activity version, i.e. its primary key, its
+``last_updated`` timestamp and the current values of the declared
+fields (all concrete fields for rules without declaration), so the
+unsaved changes of a bound form are never answered from a memoized
+result. Related items are expected to change along with their
+activity, as the activity views save both. Rules reading other data
+(lookup tables, services) see it as of their first evaluation for
+the version; ``results.clear()`` discards memoized results.
+
+Relations declared by the rules evaluated together are prefetched
+once per activity model, rules should read them through ``.all()``.
+
+Rules calling services are marked with ``io_bound``. With workers
+configured they run concurrently on a bounded thread pool, while the
+other rules of the batch are evaluated; otherwise they run inline like
+any other rule. Coroutine functions (``async def``) are always awaited
+concurrently on an event loop. Either way, a rule that has not
+finished within its timeout, or that raised, yields its fallback
+result, which is not memoized:
+
+    @io_bound(timeout=0.5, fallback=False)
+    def price_approved(self):
+        return pricing.approve(self.amount)
+
+A thread cannot be stopped, so a call timing out keeps its worker
+until it returns. While every worker is held by such calls, I/O-bound
+rules yield their fallback at once (the error being ``PoolSaturated``)
+rather than queueing behind them; services should be called with
+their own timeouts for the workers to be released.
+
+Rules run by threads or coroutines should not query the database,
+they are expected to read the activity and its declared relations
+(prefetched beforehand) and call services. Evaluation blocks the
+calling thread, which must not be running an event loop.
+
+Every evaluation is timed: recorded as the ``rule.<name>`` operation
+when instrumentation is enabled and sent along with ``rule_evaluated``
+(sender: activity model; arguments: rule, activity, result, seconds
+and error, the exception replaced by the fallback result if any).
+
+    ACTIVFLOW_RULE_CACHE_SIZE = 1024  # memoized results, 0 disables
+    ACTIVFLOW_RULE_WORKERS = 0        # threads of I/O-bound rules,
+                                      # held until timed out calls return
+    ACTIVFLOW_RULE_TIMEOUT = 5        # seconds, unless set per rule
+"""
+
+import asyncio
+import threading
+from collections import OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from time import perf_counter
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.dispatch import Signal
+
+from activflow.core.instrumentation import observe
+
+
+Dependencies = namedtuple('Dependencies', [
+    'fields',       # names of the activity fields read, None for all
+    'relations'     # lookups prefetched before evaluation
+])
+
+
+IOBound = namedtuple('IOBound', [
+    'timeout',      # seconds, None for ACTIVFLOW_RULE_TIMEOUT
+    'fallback'      # result on timeout or error
+])
+
+
+UNDECLARED = Dependencies(fields=None, relations=())
+
+AWAITED = IOBound(timeout=None, fallback=False)
+
+MISSING = object()
+
+rule_evaluated = Signal()
+
+
+class PoolSaturated(Exception):
+    """Every worker is held by calls which timed out"""
+
+
+def depends_on(fields=None, relations=()):
+    """Decorator declaring the activity fields and
+    relations a transition rule reads"""
+    def decorator(rule):
+        """Attaches the dependencies to the rule"""
+        rule.dependencies = Dependencies(
+            fields=tuple(fields) if fields is not None else None,
+            relations=tuple(relations))
+        return rule
+    return decorator
+
+
+def io_bound(timeout=None, fallback=False):
+    """Decorator marking a transition rule as I/O-bound, evaluated
+    concurrently when workers are configured"""
+    def decorator(rule):
+        """Attaches timeout and fallback to the rule"""
+        rule.io_bound = IOBound(timeout=timeout, fallback=fallback)
+        return rule
+    return decorator
+
+
+def get_dependencies(rule):
+    """Returns declared dependencies of the rule"""
+    return getattr(rule, 'dependencies', UNDECLARED)
+
+
+def rule_name(rule):
+    """Returns name of the rule for instrumentation"""
+    return getattr(rule, '__name__', type(rule).__name__)
+
+
+@lru_cache(maxsize=None)
+def state_attributes(model, fields):
+    """Returns attribute names of the activity fields
+    (all concrete fields if None) a result depends on"""
+    if fields is None:
+        return tuple(field.attname for field in model._meta.concrete_fields)
+    return tuple(model._meta.get_field(name).attname for name in fields)
+
+
+def version_key(activity, rule):
+    """Returns memo key of the rule's result for the
+    activity version, None if it cannot be memoized"""
+    if activity.pk is None:
+        return None
+
+    model = type(activity)
+    key = (rule, model, activity.pk, activity.last_updated) + tuple(
+        getattr(activity, name) for name in state_attributes(
+            model, get_dependencies(rule).fields))
+
+    try:
+        hash(key)
+    except TypeError:  # unhashable field values
+        return None
+    return key
+
+
+class ResultCache(object):
+    """Least recently used rule results, by activity version"""
+    def __init__(self):
+        """Initializes ResultCache"""
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Returns memoized result, MISSING if there is none"""
+        with self.lock:
+            try:
+                self.results.move_to_end(key)
+            except KeyError:
+                return MISSING
+            return self.results[key]
+
+    def set(self, key, result):
+        """Memoizes the result, evicting the least recently used"""
+        size = getattr(settings, 'ACTIVFLOW_RULE_CACHE_SIZE', 1024)
+        with self.lock:
+            self.results[key] = result
+            self.results.move_to_end(key)
+            while len(self.results) > size:
+                self.results.popitem(last=False)
+
+    def clear(self):
+        """Discards memoized results"""
+        with self.lock:
+            self.results.clear()
+
+
+results = ResultCache()
+
+
+def get_timeout(options):
+    """Returns timeout in seconds of an I/O-bound rule"""
+    if options.timeout is not None:
+        return options.timeout
+    return getattr(settings, 'ACTIVFLOW_RULE_TIMEOUT', 5)
+
+
+def call(rule, activity):
+    """Evaluates the rule for the activity, returns
+    (result, seconds, error)"""
+    start = perf_counter()
+    result = bool(rule(activity))
+    return (result, perf_counter() - start, None)
+
+
+def record(rule, activity, result, seconds, error=None):
+    """Records the timing of an evaluated rule"""
+    observe('rule.' + rule_name(rule), seconds)
+    rule_evaluated.send(
+        sender=type(activity), rule=rule, activity=activity,
+        result=result, seconds=seconds, error=error)
+
+
+class RuleExecutor(object):
+    """Bounded thread pool of I/O-bound rules, resized
+    along with ACTIVFLOW_RULE_WORKERS"""
+    def __init__(self):
+        """Initializes RuleExecutor"""
+        self.workers = 0
+        self.pool = None
+        self.stalled = set()
+        self.lock = threading.Lock()
+
+    def get_pool(self):
+        """Returns the thread pool, None if not configured"""
+        workers = getattr(settings, 'ACTIVFLOW_RULE_WORKERS', 0)
+        with self.lock:
+            if workers != self.workers:
+                if self.pool is not None:
+                    self.pool.shutdown(wait=False)
+                self.pool = ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix='activflow-rule'
+                ) if workers else None
+                self.workers = workers
+                self.stalled = set()
+            return self.pool
+
+    def stall(self, future):
+        """Tracks a call which timed out until its worker is released"""
+        with self.lock:
+            self.stalled.add(future)
+        future.add_done_callback(self.release)
+
+    def release(self, future):
+        """Stops tracking a call which timed out, once it returned"""
+        with self.lock:
+            self.stalled.discard(future)
+
+    def saturated(self):
+        """Returns whether every worker is held by calls which
+        timed out"""
+        with self.lock:
+            return len(self.stalled) >= self.workers
+
+    def submit(self, calls):
+        """Starts the (rule, activity) calls, returns a function
+        waiting for their (result, seconds, error). Calls yield their
+        fallback at once while the pool is saturated."""
+        pool = self.get_pool()
+        start = perf_counter()
+
+        if self.saturated():
+            def fallbacks():
+                """Returns fallback results of the calls"""
+                return [(rule.io_bound.fallback, 0.0, PoolSaturated(
+                    'All {} rule workers are held by calls which timed '
+                    'out'.format(self.workers))) for (rule, _) in calls]
+            return fallbacks
+
+        futures = [pool.submit(call, rule, activity) for (
+            rule, activity) in calls]
+
+        def wait():
+            """Collects outcomes, within the timeout of each rule"""
+            outcomes = []
+            for ((rule, _), future) in zip(calls, futures):
+                options = rule.io_bound
+                remaining = get_timeout(options) - (perf_counter() - start)
+                try:
+                    outcomes.append(future.result(timeout=max(remaining, 0)))
+                except Exception as error:  # timeout or raised by the rule
+                    if not future.cancel() and not future.done():
+                        self.stall(future)
+                    outcomes.append((
+                        options.fallback, perf_counter() - start, error))
+            return outcomes
+        return wait
+
+
+executor = RuleExecutor()
+
+
+async def await_rules(calls):
+    """Awaits the (rule, activity) coroutine calls concurrently,
+    returns their (result, seconds, error)"""
+    async def timed(rule, activity):
+        """Awaits the rule within its timeout"""
+        options = getattr(rule, 'io_bound', AWAITED)
+        start = perf_counter()
+        try:
+            result = bool(await asyncio.wait_for(
+                rule(activity), get_timeout(options)))
+            return (result, perf_counter() - start, None)
+        except Exception as error:  # timeout or raised by the rule
+            return (options.fallback, perf_counter() - start, error)
+
+    return await asyncio.gather(*(timed(rule, activity) for (
+        rule, activity) in calls))
+
+
+def run_coroutines(calls):
+    """Runs the coroutine calls on a new event loop"""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(await_rules(calls))
+    finally:
+        loop.close()
+
+
+def run(pending):
+    """Returns (result, seconds, error) of the pending (rule, activity)
+    calls: I/O-bound rules are started on the thread pool (if any)
+    and coroutines awaited while the other rules are evaluated"""
+    threaded = executor.get_pool() is not None
+    (concurrent, awaited, inline) = ([], [], [])
+
+    for (index, (rule, _)) in enumerate(pending):
+        if asyncio.iscoroutinefunction(rule):
+            awaited.append(index)
+        elif threaded and hasattr(rule, 'io_bound'):
+            concurrent.append(index)
+        else:
+            inline.append(index)
+
+    outcomes = [None] * len(pending)
+    wait = executor.submit([pending[index] for index in (
+        concurrent)]) if concurrent else list
+
+    for index in inline:
+        outcomes[index] = call(*pending[index])
+    if awaited:
+        for (index, outcome) in zip(awaited, run_coroutines([
+                pending[index] for index in awaited])):
+            outcomes[index] = outcome
+    for (index, outcome) in zip(concurrent, wait()):
+        outcomes[index] = outcome
+
+    return outcomes
+
+
+def prefetch(pending):
+    """Prefetches relations declared by the pending (activity, rule)
+    evaluations, once per activity model"""
+    batches = defaultdict(lambda: (OrderedDict(), set()))
+    for (activity, rule) in pending:
+        relations = get_dependencies(rule).relations
+        if relations:
+            (activities, lookups) = batches[type(activity)]
+            activities[id(activity)] = activity
+            lookups.update(relations)
+
+    for (activities, lookups) in batches.values():
+        prefetch_related_objects(list(activities.values()), *sorted(lookups))
+
+
+def evaluate(batch):
+    """Returns {transition: result} for each (activity, rules) of the
+    batch, rules mapping transitions to their rule. Memoized results
+    are reused, the other rules are evaluated (I/O-bound ones
+    concurrently) after prefetching the relations they declare."""
+    outcomes = [{} for _ in batch]
+    pending = []
+
+    for (outcome, (activity, rules)) in zip(outcomes, batch):
+        for (transition, rule) in rules.items():
+            key = version_key(activity, rule)
+            result = MISSING if key is None else results.get(key)
+            if result is MISSING:
+                pending.append((outcome, transition, activity, rule, key))
+            else:
+                outcome[transition] = result
+
+    prefetch([(activity, rule) for (_, _, activity, rule, _) in pending])
+
+    for ((outcome, transition, activity, rule, key), (
+            result, seconds, error)) in zip(pending, run([(
+                rule, activity) for (_, _, activity, rule, _) in pending])):
+        record(rule, activity, result, seconds, error)
+        outcome[transition] = result
+        if key is not None and error is None:
+            results.set(key, result)
+
+    return outcomes
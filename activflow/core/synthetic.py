@@ -0,0 +1,310 @@
+"""Synthetic workflow data for profiling and benchmarks
+
+Walks the FLOW of workflow apps to generate requests with multi-step
+task chains (including rollbacks), their activities and the inline
+rows of the activities. Rows get explicit primary keys and timestamps
+derived from a seeded random generator, so the same seed always
+produces the same dataset.
+
+Rows are kept as plain values, prepared for the database once per
+value rather than once per model field, and written with multi-row
+INSERT statements, one transaction per batch of requests; model
+instances, save() and signals are bypassed entirely.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import Group, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import (
+    BooleanField,
+    CharField,
+    DateField,
+    DateTimeField,
+    DecimalField,
+    FloatField,
+    IntegerField,
+    Max,
+    TextField)
+from django.utils import timezone
+
+from activflow.core.helpers import flow_config, get_relations
+from activflow.core.models import Request, Task
+
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+# rollbacks stop once a request has this many tasks
+MAX_TASKS = 50
+
+# rows per INSERT statement, within the backend's parameter limit
+ROWS_PER_STATEMENT = 500
+
+
+class Table(object):
+    """Rows of a model pending insertion"""
+    def __init__(self, model):
+        """Initializes Table"""
+        quote = connection.ops.quote_name
+        self.model = model
+        self.fields = model._meta.concrete_fields
+        self.rows = []
+        self.count = 0
+        self.next_id = (model.objects.aggregate(
+            last=Max('pk'))['last'] or 0) + 1
+        self.sql = 'INSERT INTO {} ({}) VALUES '.format(
+            quote(model._meta.db_table),
+            ', '.join(quote(field.column) for field in self.fields))
+        self.placeholder = '({})'.format(', '.join(['%s'] * len(self.fields)))
+        self.size = max(1, min(
+            ROWS_PER_STATEMENT, connection.ops.bulk_batch_size(
+                self.fields, [None] * ROWS_PER_STATEMENT)))
+
+    def add(self, **values):
+        """Adds a row, given as {attname: prepared value}, and returns it"""
+        values['id'] = self.next_id
+        self.next_id += 1
+        self.rows.append(values)
+        return values
+
+    def flush(self, cursor):
+        """Inserts pending rows through the backend's own cursor,
+        bypassing Django's debug query log and execute wrappers"""
+        names = [field.attname for field in self.fields]
+        for start in range(0, len(self.rows), self.size):
+            chunk = self.rows[start:start + self.size]
+            cursor.cursor.execute(
+                self.sql + ', '.join([self.placeholder] * len(chunk)),
+                [row.get(name) for row in chunk for name in names])
+        self.count += len(self.rows)
+        self.rows = []
+
+
+class Generator(object):
+    """Generates synthetic requests of workflow apps"""
+    def __init__(self, modules, seed=0, users=50, lines=(0, 5),
+                 rollback_rate=0.1, abandon_rate=0.2, age=365,
+                 batch_size=5000):
+        """Initializes Generator"""
+        self.modules = modules
+        self.rng = random.Random(seed)
+        self.user_count = users
+        self.lines = lines
+        self.rollback_rate = rollback_rate
+        self.abandon_rate = abandon_rate
+        self.age = age
+        self.batch_size = batch_size
+
+    def setup(self):
+        """Creates users and the groups of all roles, prepares tables"""
+        usernames = ['synthetic{}'.format(index) for index in range(
+            self.user_count)]
+        existing = set(User.objects.filter(
+            username__in=usernames).values_list('username', flat=True))
+        User.objects.bulk_create([User(username=username) for username in (
+            usernames) if username not in existing])
+        self.users = list(User.objects.filter(
+            username__in=usernames).order_by('id').values_list(
+                'id', flat=True))
+
+        self.groups = {}
+        models = [Request, Task]
+        for module in self.modules:
+            for activity in flow_config(module).activities.values():
+                self.groups[activity.role] = Group.objects.get_or_create(
+                    name=activity.role)[0].id
+                models.append(activity.model)
+                models.extend(related for (related, _, _) in (
+                    get_relations(activity.model)))
+
+        self.tables = {model: Table(model) for model in dict.fromkeys(models)}
+        self.types = {model: ContentType.objects.get_for_model(
+            model).id for model in self.tables}
+        self.generators = {model: self.field_generators(
+            model) for model in list(self.tables)[2:]}
+
+    def field_generators(self, model):
+        """Returns (attname, generator) of the model's plain fields,
+        a generator being called with (row id, prepared timestamp)"""
+        generators = []
+
+        for field in model._meta.concrete_fields:
+            if field.primary_key:
+                continue
+            if field.is_relation:
+                # only links to the task and to activities are set
+                if not field.null and field.related_model not in (
+                        self.tables):
+                    raise ValueError(
+                        'Cannot generate a value for {}'.format(field))
+                continue
+
+            generate = self.field_generator(field)
+            if generate is not None:
+                generators.append((field.attname, generate))
+
+        return generators
+
+    def field_generator(self, field):
+        """Returns generator of a plain field's values,
+        None for a nullable field left unset"""
+        rng = self.rng
+
+        if field.choices:
+            values = [choice[0] for choice in field.choices]
+
+            def generate(*_):
+                """Returns one of the choices"""
+                return rng.choice(values)
+        elif isinstance(field, (CharField, TextField)):
+            text = 'Synthetic {} '.format(field.name)
+
+            def generate(identifier, _):
+                """Returns text numbered by the row id"""
+                return (text + str(identifier))[:field.max_length]
+        elif isinstance(field, BooleanField):
+            def generate(*_):
+                """Returns a random flag"""
+                return rng.random() < 0.5
+        elif isinstance(field, IntegerField):
+            def generate(*_):
+                """Returns a random integer"""
+                return rng.randint(0, 1000)
+        elif isinstance(field, DecimalField):
+            def generate(*_):
+                """Returns a random decimal prepared for the database"""
+                return connection.ops.adapt_decimalfield_value(
+                    rng.randint(0, 10 ** 5) / 100.0, field.max_digits,
+                    field.decimal_places)
+        elif isinstance(field, FloatField):
+            def generate(*_):
+                """Returns a random float"""
+                return rng.uniform(0, 1000)
+        elif isinstance(field, DateTimeField):
+            def generate(_, stamp):
+                """Returns the timestamp"""
+                return stamp
+        elif isinstance(field, DateField):
+            def generate(_, stamp):
+                """Returns date of the timestamp"""
+                return stamp[:10] if isinstance(stamp, str) else stamp.date()
+        elif field.null:
+            return None
+        else:
+            raise ValueError('Cannot generate a value for {}'.format(field))
+
+        return generate
+
+    def row(self, model, stamp, **values):
+        """Adds a row with synthetic field values"""
+        table = self.tables[model]
+        identifier = table.next_id
+        for (name, generate) in self.generators[model]:
+            if name not in values:
+                values[name] = generate(identifier, stamp)
+        return table.add(**values)
+
+    def activity(self, model, task, stamp):
+        """Adds an activity of the task and its inline rows"""
+        activity = self.row(model, stamp, task_id=task['id'])
+
+        for (related, fk, _) in get_relations(model):
+            for _ in range(self.rng.randint(*self.lines)):
+                self.row(related, stamp, **{fk + '_id': activity['id']})
+
+        task['activity_type_id'] = self.types[model]
+        task['activity_id'] = activity['id']
+
+    def request(self, module):
+        """Adds a request along with its task chain"""
+        rng = self.rng
+        config = flow_config(module)
+        adapt = connection.ops.adapt_datetimefield_value
+        when = EPOCH + timedelta(minutes=rng.randrange(self.age * 24 * 60))
+        stamp = adapt(when)
+        request = self.tables[Request].add(
+            requester_id=rng.choice(self.users),
+            module_ref=module,
+            status='Initiated',
+            creation_date=stamp,
+            last_updated=stamp)
+        chain = []
+
+        def task(ref, status):
+            """Adds the next task of the chain"""
+            chain.append(self.tables[Task].add(
+                request_id=request['id'],
+                sequence=len(chain) + 1,
+                assignee_id=self.groups[config.activities[ref].role],
+                updated_by_id=rng.choice(self.users),
+                activity_ref=ref,
+                status=status,
+                creation_date=stamp,
+                last_updated=stamp))
+            return chain[-1]
+
+        current = task(config.INITIAL, 'In Progress')
+        self.activity(config.activities[config.INITIAL].model, current, stamp)
+
+        while True:
+            when += timedelta(minutes=rng.randrange(1, 3 * 24 * 60))
+            stamp = adapt(when)
+            transitions = config.activities[
+                current['activity_ref']].transitions
+
+            if rng.random() < self.abandon_rate:
+                break
+
+            # as Task.rollback: initial activities cannot be rolled back
+            if current['activity_ref'] != config.INITIAL and len(
+                    chain) < MAX_TASKS and rng.random() < self.rollback_rate:
+                previous = chain[-2]
+                previous['status'] = current['status'] = 'Rolled Back'
+                current = task(previous['activity_ref'], 'Not Started')
+                self.activity(config.activities[
+                    previous['activity_ref']].model, current, stamp)
+                continue
+
+            if not transitions:  # finished
+                current['status'] = request['status'] = 'Completed'
+                break
+
+            current['status'] = 'Completed'
+            current['last_updated'] = stamp
+            current = task(rng.choice(sorted(transitions)), 'Not Started')
+            if rng.random() < self.abandon_rate:  # not picked up yet
+                break
+            current['status'] = 'In Progress'
+            self.activity(config.activities[
+                current['activity_ref']].model, current, stamp)
+
+        request['current_task_id'] = current['id']
+        request['last_updated'] = current['last_updated'] = stamp
+
+    def write(self):
+        """Inserts pending rows of all tables in one transaction"""
+        with transaction.atomic(), connection.cursor() as cursor:
+            for table in self.tables.values():
+                table.flush(cursor)
+
+    def generate(self, count):
+        """Generates count requests spread over the workflow apps,
+        returns {model: rows written}"""
+        self.setup()
+        for index in range(count):
+            self.request(self.modules[index % len(self.modules)])
+            if (index + 1) % self.batch_size == 0:
+                self.write()
+        self.write()
+
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), list(self.tables))
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+
+        return {model: table.count for (model, table) in self.tables.items()}
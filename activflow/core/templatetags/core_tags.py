@@ -1,18 +1,22 @@
 """Template Tags"""
 
-import itertools
-from importlib import import_module
 from collections import OrderedDict
 
-from django.apps import apps
 from django import template
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
 
 from activflow.core.constants import REQUEST_IDENTIFIER
 from activflow.core.helpers import (
-    activity_config,
+    flow_config,
+    get_display_fields,
+    get_relations,
+    prefetch_relations,
     wysiwyg_config
 )
 
+from activflow.core.fragments import render_cached
+from activflow.core.instrumentation import instrument
 from activflow.core.models import Task
 
 register = template.Library()
@@ -25,74 +29,60 @@ def label_with_class(value, arg):
 
 
 @register.simple_tag(takes_context=True)
+@instrument('tags.activity_data')
 def activity_data(context, instance, option, _type):
     """Returns activity data as in field/value pair"""
     app = context['app_title']
     model = type(instance)
 
-    def filter(configuration):
-        """Filter fields to display based on configuration"""
-        for field_name in configuration:
-            if option in configuration[field_name]:
-                yield field_name
-
-    def get_fields_from_config(model, instance, config):
-        """Returns field/value pairs from configuration"""
+    def get_field_values(item, fields):
+        """Returns field/value pairs of the item"""
         return OrderedDict([
-            (
-                model().class_meta.get_field(field_name).verbose_name,
-                getattr(instance, field_name)
-            )
-            for field_name in itertools.islice(filter(config), len(config))
+            (verbose_name, getattr(item, name))
+            for (name, verbose_name) in fields
         ])
 
-    def get_all_fields(instance, exclude=None):
-        """Returns all field/value pairs on the model"""
-        exclude = exclude or []
-        fields = [field for field in (
-            (
-                field.name,
-                field.verbose_name
-            ) for field in instance.class_meta.get_fields()
-        ) if field[0] not in ['id', 'task', 'task_id'] + exclude]
-        return {field[1]: getattr(
-            instance, field[0]) for field in fields}
-
     if _type == 'model':
-        try:
-            field_config = activity_config(
-                app, model.__name__)['Fields']
-            return get_fields_from_config(model, instance, field_config)
-        except KeyError:
-            return get_all_fields(instance)
-    else:
-        related_model_fields = {}
-        for relation in model().class_meta.related_objects:
-            related_model = relation.related_model
-            for field in related_model().class_meta.fields:
-                if all([
-                    field.get_internal_type() == 'ForeignKey',
-                    field.related_model == model]
-                ):
-                    instances = related_model.objects.filter(
-                        **{field.name: instance})
-                    try:
-                        field_config = activity_config(
-                            app,
-                            model.__name__
-                        )['Relations'][related_model.__name__]
-                        relatd_items_detail = [get_fields_from_config(
-                            related_model,
-                            inst,
-                            field_config
-                        ) for inst in instances]
-                    except KeyError:
-                        relatd_items_detail = []
-                        for inst in instances:
-                            relatd_items_detail.append(
-                                get_all_fields(inst, exclude=[field.name]))
-            related_model_fields[related_model.__name__] = relatd_items_detail
-        return related_model_fields
+        return get_field_values(
+            instance, get_display_fields(app, model, option))
+
+    return OrderedDict([(
+        related_model.__name__,
+        [get_field_values(item, get_display_fields(
+            app, model, option, related_model
+        )) for item in getattr(instance, accessor).all()]
+    ) for (related_model, _, accessor) in get_relations(model)])
+
+
+def render_history(tasks):
+    """Renders history entries of the tasks, loading their activities
+    and related items with one query per model"""
+    prefetch_related_objects(tasks, 'activity')
+    prefetch_relations(task.activity for task in tasks if task.activity)
+
+    return [render_to_string('core/widgets/history_entry.html', {
+        'task': task, 'activity': task.activity,
+        'app_title': task.request.module_ref
+    }) if task.activity else '' for task in tasks]
+
+
+@register.simple_tag
+@instrument('tags.request_history')
+def request_history(request):
+    """Returns tasks of the request, those with an activity carrying
+    their rendered history entry as ``fragment``"""
+    tasks = list(request.tasks.select_related(
+        'assignee').order_by('sequence'))
+
+    for task in tasks:
+        task.request = request
+        task.fragment = ''
+
+    render_cached([task for task in tasks if task.activity_id], lambda task: (
+        task.request_id, 'history', task.id, task.last_updated,
+        task.activity_id), render_history)
+
+    return tasks
 
 
 @register.simple_tag(takes_context=True)
@@ -110,17 +100,13 @@ def wysiwyg_form_fields(context):
 @register.simple_tag
 def activity_title(ref, app):
     """Returns activity name"""
-    return import_module(
-        '{}.flow'.format(apps.get_app_config(app).name)
-    ).FLOW[ref]['model']().title
+    return flow_config(app).activities[ref].title
 
 
 @register.simple_tag
 def activity_friendly_name(ref, app):
     """Returns activity friendly name"""
-    return import_module(
-        '{}.flow'.format(apps.get_app_config(app).name)
-    ).FLOW[ref]['name']
+    return flow_config(app).activities[ref].name
 
 
 @register.simple_tag
@@ -0,0 +1,128 @@
+"""Query budget assertions for tests
+
+    with query_budget(5):
+        client.get(url)
+
+    @query_budget(3)
+    def render_history():
+        ...
+
+Budgets which are exceeded fail with the offending SQL grouped by the
+call site (first frame outside Django, the standard library and the
+engine's instrumentation) which issued it.
+"""
+
+import os
+import sys
+import traceback
+from collections import OrderedDict
+from contextlib import ContextDecorator
+
+import django
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from activflow.core import instrumentation
+
+
+IGNORED = tuple(os.path.dirname(path) + os.sep for path in (
+    django.__file__, os.__file__)) + (__file__, instrumentation.__file__)
+
+
+def call_site():
+    """Returns 'file:line in function' of the innermost frame
+    outside the ignored modules"""
+    for frame in reversed(traceback.extract_stack(sys._getframe(1))):
+        if not frame.filename.startswith(IGNORED):
+            return '{}:{} in {}'.format(
+                os.path.relpath(frame.filename), frame.lineno, frame.name)
+    return '<unknown>'
+
+
+class QueryBudget(ContextDecorator):
+    """Context manager/decorator failing when the block issues more
+    queries than the budget (None to only record them)"""
+    def __init__(self, budget=None, using=DEFAULT_DB_ALIAS):
+        """Initializes QueryBudget"""
+        self.budget = budget
+        self.connection = connections[using]
+        self.queries = []
+        self.wrapper = None
+
+    def __len__(self):
+        """Returns number of recorded queries"""
+        return len(self.queries)
+
+    def __enter__(self):
+        """Starts recording queries"""
+        self.queries = []
+        self.wrapper = self.connection.execute_wrapper(self.record)
+        self.wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        """Stops recording and checks the budget"""
+        self.wrapper.__exit__(exc_type, exc_value, exc_traceback)
+
+        if exc_type is None and self.budget is not None and (
+                len(self) > self.budget):
+            raise AssertionError(
+                '{} queries executed, budget is {}\n{}'.format(
+                    len(self), self.budget, self.report()))
+
+    def record(self, execute, sql, params, many, context):
+        """Database execute wrapper recording the query"""
+        self.queries.append((call_site(), sql))
+        return execute(sql, params, many, context)
+
+    def grouped(self):
+        """Returns {call site: [sql]} in order of execution"""
+        groups = OrderedDict()
+        for (site, sql) in self.queries:
+            groups.setdefault(site, []).append(sql)
+        return groups
+
+    def report(self):
+        """Returns recorded queries grouped by call site"""
+        lines = []
+        for (site, statements) in self.grouped().items():
+            lines.append('{} ({} queries)'.format(site, len(statements)))
+            lines.extend('    {}'.format(sql) for sql in statements)
+        return '\n'.join(lines)
+
+
+def query_budget(budget, using=DEFAULT_DB_ALIAS):
+    """Returns a QueryBudget for the block or decorated function"""
+    return QueryBudget(budget, using)
+
+
+class QueryBudgetMixin(object):
+    """TestCase mixin asserting query budgets"""
+    def assertQueryBudget(self, budget, using=DEFAULT_DB_ALIAS):
+        """Returns context manager failing over the budget"""
+        return query_budget(budget, using)
+
+    def assertConstantQueries(self, grow, actions, sizes=(1, 10, 100)):
+        """Grows fixtures to each of the sizes and runs the actions,
+        given as {name: (budget, action)}. Each action receives the
+        QueryBudget to wrap the measured part of its work in.
+
+        Asserts that every action stays within its budget and issues
+        the same number of queries at every size."""
+        runs = OrderedDict((name, []) for name in actions)
+
+        for size in sizes:
+            grow(size)
+            for (name, (budget, action)) in actions.items():
+                measured = QueryBudget(budget)
+                with self.subTest(action=name, size=size):
+                    action(measured)
+                runs[name].append((size, measured))
+
+        for (name, measured) in runs.items():
+            counts = [len(budget) for (_, budget) in measured]
+            if len(set(counts)) > 1:
+                (size, largest) = measured[counts.index(max(counts))]
+                self.fail(
+                    '{}: queries grow with data {}, at size {}:\n{}'.format(
+                        name, dict(zip(sizes, counts)), size,
+                        largest.report()))
@@ -6,6 +6,11 @@ from django.views.generic import TemplateView
 from activflow.core.constants import REQUEST_IDENTIFIER
 from activflow.core.views import (
     workflows,
+    metrics,
+    Inbox,
+    BulkInitiate,
+    BulkSubmit,
+    ExportRequests,
     WorkflowDetail,
     CreateActivity,
     ViewActivity,
@@ -16,11 +21,33 @@ from activflow.core.views import (
 
 urlpatterns = [
     url(r'^$', workflows, name='workflows'),
+    url(r'^metrics$', metrics, name='metrics'),
+    url(r'^inbox/$', Inbox.as_view(), name='inbox'),
+    url(
+        r'^inbox/json/$',
+        Inbox.as_view(response_format='json'),
+        name='inbox-json'
+    ),
     url(
         r'^(?P<app_name>\w+)$',
         WorkflowDetail.as_view(),
         name='workflow-detail'
     ),
+    url(
+        r'^(?P<app_name>\w+)/BulkInitiate/$',
+        BulkInitiate.as_view(),
+        name='bulk-initiate'
+    ),
+    url(
+        r'^(?P<app_name>\w+)/BulkSubmit/$',
+        BulkSubmit.as_view(),
+        name='bulk-submit'
+    ),
+    url(
+        r'^(?P<app_name>\w+)/Export/$',
+        ExportRequests.as_view(),
+        name='export'
+    ),
     url(
         r'^(?P<app_name>\w+)/(?P<model_name>\w+)/Create/(?P<pk>\d+|{})$'.
         format(REQUEST_IDENTIFIER),
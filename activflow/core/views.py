@@ -1,26 +1,61 @@
 """Generic workflow engine views"""
 
+import json
+
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse, reverse_lazy
 from django.db import transaction
-from django.http import HttpResponseRedirect
+from django.db.models import prefetch_related_objects
+from django.conf import settings
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse
+)
 from django.shortcuts import render
+from django.template.loader import render_to_string
 from django.views import generic
 
-from activflow.core.constants import WORKFLOW_APPS, REQUEST_IDENTIFIER
+from activflow.core.bulk import (
+    initiate_requests,
+    save_formset,
+    submit_tasks
+)
+from activflow.core.constants import (
+    WORKFLOW_APPS,
+    REQUEST_IDENTIFIER,
+    REQUESTS_PER_PAGE,
+    TASKS_PER_PAGE
+)
+from activflow.core.export import FORMATS, export
+from activflow.core.forms import RequestFilterForm
+from activflow.core.fragments import render_cached
+from activflow.core.instrumentation import metrics as collected_metrics
 from activflow.core.helpers import (
     get_model,
     get_model_instance,
     get_form,
     get_formsets,
     get_request_params,
-    flow_config,
-    get_fk
+    flow_config
 )
 
 from activflow.core.mixins import AccessDeniedMixin
-from activflow.core.models import get_workflows_requests, get_task
+from activflow.core.models import (
+    get_inbox_tasks,
+    get_workflows_requests,
+    get_task
+)
+from activflow.core.pagination import paginate
+from activflow.core.permissions import (
+    can_create,
+    get_task_permissions,
+    get_user_groups
+)
 
 
 @login_required
@@ -29,17 +64,69 @@ def workflows(request):
     return render(request, 'index.html', {'workflows': WORKFLOW_APPS})
 
 
+def metrics(request):
+    """Exposes collected metrics in Prometheus text format"""
+    if not getattr(settings, 'ACTIVFLOW_METRICS', False):
+        raise Http404
+
+    return HttpResponse(
+        collected_metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 class WorkflowDetail(LoginRequiredMixin, generic.TemplateView):
     """Generic view to list worflow requests & tasks"""
     template_name = 'core/workflow.html'
 
+    @staticmethod
+    def fragment_key(request):
+        """Returns cache key parts of the request's row"""
+        return (request.id, 'row', request.last_updated, [(
+            task.id, task.last_updated, task.activity_id, task.permissions
+        ) for task in request.tasks.all()])
+
+    @staticmethod
+    def render_rows(app_title, requests):
+        """Renders rows of the requests, loading their activities"""
+        prefetch_related_objects(requests, 'tasks__activity')
+
+        return [render_to_string('core/widgets/request_row.html', {
+            'request': request, 'app_title': app_title
+        }) for request in requests]
+
     def get_context_data(self, **kwargs):
         """Retrieve context data<"""
         context = super(WorkflowDetail, self).get_context_data(**kwargs)
         app_title = get_request_params('app_name', **kwargs)
         config = flow_config(app_title)
-        model = config.FLOW[config.INITIAL]['model']().title
-        context['requests'] = get_workflows_requests(app_title)
+        model = config.activities[config.INITIAL].title
+        filters = RequestFilterForm(self.request.GET)
+        page = paginate(
+            get_workflows_requests(app_title, **(
+                filters.cleaned_data if filters.is_valid() else {})),
+            self.request.GET.get('cursor'),
+            REQUESTS_PER_PAGE)
+
+        params = self.request.GET.copy()
+        if params.pop('cursor', None):
+            context['first_page'] = params.urlencode()
+        if page.next_cursor:
+            params['cursor'] = page.next_cursor
+            context['next_page'] = params.urlencode()
+
+        permissions = get_task_permissions(self.request, [
+            task for request in page.object_list
+            for task in request.tasks.all()])
+
+        for request in page.object_list:
+            for task in request.tasks.all():
+                task.permissions = permissions[task.id]
+
+        render_cached(page.object_list, self.fragment_key, lambda requests: (
+            self.render_rows(app_title, requests)))
+
+        context['requests'] = page.object_list
+        context['filters'] = filters
         context['request_identifier'] = REQUEST_IDENTIFIER
         context['workflow_title'] = config.TITLE
         context['description'] = config.DESCRIPTION
@@ -48,6 +135,135 @@ class WorkflowDetail(LoginRequiredMixin, generic.TemplateView):
         return context
 
 
+class Inbox(LoginRequiredMixin, generic.View):
+    """Lists open tasks assigned to the user's groups
+    across all workflows, as HTML or JSON"""
+    response_format = 'html'
+
+    @staticmethod
+    def describe(task):
+        """Returns inbox entry for the task"""
+        module = task.request.module_ref
+        config = flow_config(module)
+        activity = config.activities[task.activity_ref]
+
+        return {
+            'id': task.id,
+            'request': task.request_id,
+            'app': module,
+            'workflow': config.TITLE,
+            'activity': activity.name,
+            'status': task.status,
+            'assignee': task.assignee.name,
+            'requester': task.request.requester.username,
+            'assigned': task.creation_date,
+            'updated': task.last_updated,
+            'url': reverse('update', args=(
+                module, activity.title, task.activity_id
+            )) if task.activity else reverse('create', args=(
+                module, activity.title, task.id))
+        }
+
+    def get(self, request, **kwargs):
+        """GET request handler for inbox"""
+        page = paginate(
+            get_inbox_tasks(get_user_groups(request)),
+            request.GET.get('cursor'),
+            TASKS_PER_PAGE)
+        tasks = [self.describe(task) for task in page.object_list]
+
+        if self.response_format == 'json':
+            return JsonResponse({'tasks': tasks, 'next': page.next_cursor})
+
+        return render(request, 'core/inbox.html', {
+            'tasks': tasks,
+            'next_cursor': page.next_cursor,
+            'paged': 'cursor' in request.GET
+        })
+
+
+class BulkInitiate(LoginRequiredMixin, generic.View):
+    """Initiates workflow requests from a JSON list of
+    initial activity payloads"""
+    def post(self, request, **kwargs):
+        """POST request handler for bulk initiation"""
+        app_title = get_request_params('app_name', **kwargs)
+
+        if not (request.user.is_superuser or can_create(
+                request, app_title, REQUEST_IDENTIFIER)):
+            return JsonResponse({'error': 'Access denied'}, status=403)
+
+        try:
+            rows = json.loads(request.body)
+        except ValueError:
+            rows = None
+
+        if isinstance(rows, dict):
+            rows = rows.get('rows')
+        if not isinstance(rows, list) or not all(
+                isinstance(row, dict) for row in rows):
+            return JsonResponse(
+                {'error': 'Expected a list of objects'}, status=400)
+
+        result = initiate_requests(app_title, request.user, rows)
+
+        return JsonResponse(result._asdict())
+
+
+class BulkSubmit(LoginRequiredMixin, generic.View):
+    """Submits a JSON list of tasks to the next activity"""
+    def post(self, request, **kwargs):
+        """POST request handler for bulk submission"""
+        app_title = get_request_params('app_name', **kwargs)
+
+        if app_title not in WORKFLOW_APPS:
+            return JsonResponse({'error': 'Unknown workflow'}, status=404)
+
+        try:
+            payload = json.loads(request.body)
+            (tasks, transition) = (payload['tasks'], payload['transition'])
+        except (ValueError, TypeError, KeyError):
+            tasks = transition = None
+
+        if not isinstance(tasks, list) or not all(
+                isinstance(task, int) for task in tasks) or (
+                    transition not in flow_config(app_title).activities):
+            return JsonResponse({
+                'error': 'Expected a list of task ids and a transition'
+            }, status=400)
+
+        result = submit_tasks(
+            app_title, request.user, tasks, transition,
+            None if request.user.is_superuser else get_user_groups(request))
+
+        return JsonResponse(result._asdict())
+
+
+class ExportRequests(LoginRequiredMixin, generic.View):
+    """Streams requests, tasks and activity data of a workflow
+    as NDJSON or CSV, optionally gzip compressed (staff only)"""
+    def get(self, request, **kwargs):
+        """GET request handler for export"""
+        if not request.user.is_staff:
+            return render(request, 'core/denied.html')
+
+        app_title = get_request_params('app_name', **kwargs)
+        fmt = request.GET.get('format', 'ndjson')
+        gzip = request.GET.get('gzip') == '1'
+
+        if fmt not in FORMATS:
+            return HttpResponseBadRequest('Unknown format')
+
+        response = StreamingHttpResponse(
+            export(app_title, fmt, gzip),
+            content_type='application/gzip' if gzip else FORMATS[fmt])
+        response['Content-Disposition'] = (
+            'attachment; filename="{}.{}{}"'.format(
+                app_title, fmt, '.gz' if gzip else ''))
+
+        return response
+
+
 class ViewActivity(AccessDeniedMixin, generic.DetailView):
     """Generic view to display activity details"""
     template_name = 'core/detail.html'
@@ -88,12 +304,14 @@ class DeleteActivity(LoginRequiredMixin, generic.DeleteView):
 
 class CreateActivity(AccessDeniedMixin, generic.View):
     """Generic view to initiate activity"""
+    operation = 'create'
+
     def get(self, request, **kwargs):
         """GET request handler for Create operation"""
-        form = get_form(**kwargs)
+        form = get_form(self.operation, **kwargs)
         formsets = [formset(
             prefix=formset.form.__name__) for formset in get_formsets(
-                self.__class__.__name__, extra=1, **kwargs)]
+                self.operation, extra=1, **kwargs)]
         context = {'form': form, 'formsets': formsets}
 
         denied = self.check(request, **kwargs)
@@ -103,9 +321,9 @@ class CreateActivity(AccessDeniedMixin, generic.View):
     @transaction.atomic
     def post(self, request, **kwargs):
         """POST request handler for Create operation"""
-        operation = self.__class__.__name__
+        operation = self.operation
         instance = None
-        form = get_form(**kwargs)(request.POST)
+        form = get_form(operation, **kwargs)(request.POST)
         formsets = get_formsets(operation, **kwargs)
         app_title = get_request_params('app_name', **kwargs)
 
@@ -131,11 +349,13 @@ class CreateActivity(AccessDeniedMixin, generic.View):
 
 class UpdateActivity(AccessDeniedMixin, generic.View):
     """Generic view to update activity"""
+    operation = 'update'
+
     def get(self, request, **kwargs):
         """GET request handler for Update operation"""
         instance = get_model_instance(**kwargs)
-        form = get_form(**kwargs)
-        formsets = get_formsets(self.__class__.__name__, extra=1, **kwargs)
+        form = get_form(self.operation, **kwargs)
+        formsets = get_formsets(self.operation, extra=1, **kwargs)
         context = {
             'form': form(instance=instance),
             'formsets': [formset(
@@ -153,11 +373,11 @@ class UpdateActivity(AccessDeniedMixin, generic.View):
     @transaction.atomic
     def post(self, request, **kwargs):
         """POST request handler for Update operation"""
-        operation = self.__class__.__name__
+        operation = self.operation
         redirect_to_update = False
         instance = get_model_instance(**kwargs)
         app_title = get_request_params('app_name', **kwargs)
-        form = get_form(**kwargs)(request.POST, instance=instance)
+        form = get_form(operation, **kwargs)(request.POST, instance=instance)
         formsets = get_formsets(operation, **kwargs)
 
         (result, context) = FormHandler(
@@ -214,7 +434,10 @@ class FormHandler(object):
                 request[total_forms] = int(request[total_forms]) + 1
 
         formsets = [formset(
-            request, prefix=formset.form.__name__) for formset in formsets]
+            request,
+            instance=self.instance,  # None for create operation
+            prefix=formset.form.__name__
+        ) for formset in formsets]
 
         context = {
             'form': self.form,
@@ -232,31 +455,18 @@ class FormHandler(object):
         instance = self.form.save()
         # formsets
         for formset in formsets:
-            if not self.instance:  # create operation
-                objects = formset.save(commit=False)
-                if objects:
-                    fk = get_fk(objects, **kwargs)
-                    for obj in objects:
-                        setattr(obj, fk, instance)
-                        obj.save()
-            else:  # update operation
-                formset.save()
+            save_formset(formset, instance)
         return (True, instance)
 
     def report(self, formsets):
-        """Report validation errors"""
-        errors = ''
-
-        for formset in formsets:
-            for error in formset.errors:
-                errors = errors + str(error)
+        """Report validation errors, re-rendering the form and
+        formsets bound (and validated) by handle"""
+        errors = ''.join(str(error) for formset in formsets for error in (
+            formset.errors) if error)
 
         context = {
             'form': self.form,
-            'formsets': [formset(
-                self.request.POST,
-                prefix=formset.form.__name__
-            ) for formset in self.formsets],
+            'formsets': formsets,
             'error_message': errors + str(self.form.errors)
         }
 
@@ -273,8 +483,7 @@ class FormHandler(object):
         # Handle adding related instance
 
         if instruction:
-            formsets = get_formsets(self.operation, **kwargs)
-            return self.add(formsets, instruction)
+            return self.add(self.formsets, instruction)
 
         # Validate and save form/formsets
 
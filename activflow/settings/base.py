@@ -21,6 +21,7 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE = (
+    'activflow.core.instrumentation.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,3 +77,42 @@ STATICFILES_FINDERS = (
 
 LOGIN_REDIRECT_URL = '/'
 LOGIN_URL = '/auth/login/'
+
+# Caching
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Rendered fragments of workflow listings and request history,
+# cached in the given CACHES alias (None disables)
+
+ACTIVFLOW_FRAGMENT_CACHE = 'default'
+ACTIVFLOW_FRAGMENT_TIMEOUT = 24 * 60 * 60
+
+# Versions of resolved roles and of the user groups kept in sessions,
+# held in the given CACHES alias (to be shared by all processes) and
+# expiring after the timeout in seconds (None: until invalidated)
+
+ACTIVFLOW_GROUPS_CACHE = 'default'
+ACTIVFLOW_GROUPS_TIMEOUT = 60
+
+# Transition rule results memoized per activity version (0 disables)
+
+ACTIVFLOW_RULE_CACHE_SIZE = 1024
+
+# Threads evaluating I/O-bound transition rules concurrently (0 runs
+# them inline) and their default timeout in seconds. A call timing out
+# holds its thread until it returns; while all threads are held, rules
+# yield their fallback at once
+
+ACTIVFLOW_RULE_WORKERS = 0
+ACTIVFLOW_RULE_TIMEOUT = 5
+
+# Instrumentation
+
+ACTIVFLOW_METRICS = False
+ACTIVFLOW_SERVER_TIMING = False
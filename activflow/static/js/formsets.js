@@ -0,0 +1,42 @@
+/*
+ * Inline formset rows added in the browser
+ *
+ * Clicking the Add button of a formset appends a copy of the formset's
+ * empty form (rendered once as a <template>) and bumps TOTAL_FORMS,
+ * instead of posting the whole form back to the server. Browsers
+ * without <template> support fall back to the server side 'add-' path.
+ */
+(function () {
+    'use strict';
+
+    function addForm(prefix) {
+        var template = document.getElementById(prefix + '-empty-form'),
+            forms = document.getElementById(prefix + '-forms'),
+            total = document.getElementById('id_' + prefix + '-TOTAL_FORMS'),
+            maximum = document.getElementById('id_' + prefix + '-MAX_NUM_FORMS'),
+            index;
+
+        if (!template || !forms || !total || !('content' in template)) {
+            return false;
+        }
+
+        index = parseInt(total.value, 10);
+        if (maximum && index >= parseInt(maximum.value, 10)) {
+            return false;  // let the server report the limit
+        }
+
+        forms.insertAdjacentHTML(
+            'beforeend', template.innerHTML.replace(/__prefix__/g, index));
+        total.value = index + 1;
+        return true;
+    }
+
+    document.addEventListener('click', function (event) {
+        var button = event.target;
+
+        if (button.hasAttribute && button.hasAttribute('data-formset') &&
+                addForm(button.getAttribute('data-formset'))) {
+            event.preventDefault();
+        }
+    });
+}());
@@ -1,6 +1,9 @@
 """Rules"""
 
+from activflow.core.rules import depends_on
 
+
+@depends_on(fields=['bar'])
 def foo_to_corge(self):
     """Check if foo can send to corge"""
     return self.bar != 'Sample'
@@ -1,12 +1,59 @@
 """Tests for Core app"""
+import asyncio
+import csv
+import gzip
+import json
+import threading
+import time
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+from socketserver import ThreadingMixIn
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
 from django.contrib.auth.models import User, Group
+from django.core.management import call_command
+from django.template import Context, Template
+from django.template.loader import render_to_string
 from django.urls import reverse
 
 from django.test import TestCase
 from django.test import Client
+from django.test.utils import override_settings
 
-from activflow.core.models import Request
-from activflow.tests.models import Foo, Corge
+from activflow.core.bulk import initiate_requests, submit_tasks
+from activflow.core.export import export
+from activflow.core.fragments import get_cache
+from activflow.core.instrumentation import metrics
+from activflow.core.helpers import (
+    activity_config,
+    flow_config,
+    get_form,
+    get_formsets,
+    transition_config,
+    workflow_config
+)
+from activflow.core.models import Request, Task, get_workflows_requests
+from activflow.core.pagination import paginate
+from activflow.core.permissions import TaskPermissions
+from activflow.core.registry import registry
+from activflow.core.roles import RoleCache, check_groups_cache, roles
+from activflow.core.rules import (
+    PoolSaturated,
+    depends_on,
+    evaluate,
+    executor,
+    io_bound,
+    results,
+    rule_evaluated,
+    rule_name)
+from activflow.core.synthetic import Generator
+from activflow.core.testing import QueryBudgetMixin, query_budget
+from activflow.tests.forms import CustomForm
+from activflow.tests.models import Foo, FooLineItem, FooMoreLineItem, Corge
+from activflow.tests.rules import foo_to_corge
 
 
 class CoreTests(TestCase):
@@ -585,3 +632,1506 @@ class CoreTests(TestCase):
         self.assertEqual(final_task.activity_ref, 'foo_activity',
                          'Rollback did not create the required task '
                          'for previous activity')
+
+
+class RegistryTests(TestCase):
+    """Compiled workflow registry tests"""
+    def test_compiled_workflow(self):
+        """Tests indexes built from flow and configuration"""
+        workflow = flow_config('tests')
+
+        self.assertEqual(workflow.INITIAL, 'foo_activity')
+        self.assertIs(workflow.activities['foo_activity'].model, Foo)
+        self.assertEqual(workflow.refs['Corge'], 'corge_activity')
+        self.assertEqual(workflow.activities['corge_activity'].role,
+                         'Reviewer')
+        self.assertEqual(list(transition_config('tests', 'foo_activity')),
+                         ['corge_activity'])
+        self.assertIsNone(transition_config('tests', 'corge_activity'))
+        self.assertIs(workflow.forms['Foo'], CustomForm)
+        self.assertIs(workflow_config('tests'), registry.get('tests'))
+
+    def test_form_classes_are_cached(self):
+        """Tests that form classes are built once per operation"""
+        kwargs = {'app_name': 'tests', 'model_name': 'Foo'}
+        form = get_form('create', **kwargs)
+
+        self.assertIs(form, get_form('create', **kwargs))
+        self.assertTrue(issubclass(form, CustomForm))
+        self.assertEqual(
+            [formset.model for formset in get_formsets(
+                'update', extra=1, **kwargs)],
+            [FooLineItem, FooMoreLineItem])
+        self.assertEqual(get_formsets(
+            'update', app_name='tests', model_name='Corge'), [])
+
+    def test_compiled_workflow_is_read_only(self):
+        """Tests that compiled configuration cannot be modified"""
+        workflow = flow_config('tests')
+
+        with self.assertRaises(TypeError):
+            workflow.FLOW['foo_activity']['role'] = 'Reviewer'
+
+        with self.assertRaises(TypeError):
+            activity_config('tests', 'Foo')['Fields']['bar'] = []
+
+
+def create_request(user, line_items=2, submit=True):
+    """Creates a workflow request through the engine API"""
+    foo = Foo(subject='Test', bar='Example', baz='WL', qux='Nothing')
+    foo.initiate_request(user, 'tests')
+
+    for _ in range(line_items):
+        FooLineItem.objects.create(foo=foo, plugh='Abc', thud='GR')
+        FooMoreLineItem.objects.create(foo=foo, plughmore='Abc', thudmore='GR')
+
+    if submit:
+        foo.task.submit('tests', user, 'corge_activity')
+        corge = Corge(grault='Example', thud=1)
+        corge.assign_task(foo.task.request.tasks.latest('id').id)
+        corge.task.initiate()
+
+    return foo.task.request
+
+
+class WorkflowTestCase(QueryBudgetMixin, TestCase):
+    """Base of the workflow tests: groups of the roles, john_doe
+    submitting and jane_smith reviewing"""
+    def setUp(self):
+        """Test Setup"""
+        self.client = Client()
+        self.submitter = Group.objects.create(name='Submitter')
+        self.reviewer = Group.objects.create(name='Reviewer')
+        self.john_doe = User.objects.create_user(
+            'john_doe', 'john@company.com', '12345')
+        self.jane_smith = User.objects.create_user(
+            'jane_smith', 'jane@company.com', '12345')
+        self.submitter.user_set.add(self.john_doe)
+        self.reviewer.user_set.add(self.jane_smith)
+
+
+class WorkflowDetailQueryTests(WorkflowTestCase):
+    """Query cost of the workflow request listing"""
+    def setUp(self):
+        """Test Setup"""
+        super().setUp()
+        self.client.login(username='john_doe', password='12345')
+
+    def test_query_budget(self):
+        """Tests that listing cost does not grow with requests"""
+        create_request(self.john_doe, submit=False)
+
+        def grow(size):
+            """Creates requests up to the size"""
+            for _ in range(size - Request.objects.count()):
+                create_request(self.john_doe)
+
+        def listing(budget):
+            """Renders the listing"""
+            with budget:
+                response = self.client.get(reverse(
+                    'workflow-detail', kwargs={'app_name': 'tests'}))
+            self.assertContains(response, 'Corge Activity')
+            self.assertContains(response, 'Reviewer')
+
+        # session, user, requests, tasks, foo, corge
+        self.assertConstantQueries(
+            grow, {'listing': (6, listing)}, (2, 12))
+
+
+class WorkflowDetailPaginationTests(WorkflowTestCase):
+    """Keyset pagination and filtering of workflow requests"""
+    def setUp(self):
+        """Test Setup"""
+        super().setUp()
+        self.client.login(username='john_doe', password='12345')
+
+    def test_keyset_pages(self):
+        """Tests that pages cover all requests exactly once"""
+        for _ in range(5):
+            create_request(self.john_doe, line_items=0, submit=False)
+
+        expected = list(Request.objects.order_by(
+            '-last_updated', '-id').values_list('id', flat=True))
+        (visited, cursor) = ([], None)
+
+        while True:
+            page = paginate(get_workflows_requests('tests'), cursor, 2)
+            visited.extend(request.id for request in page.object_list)
+            cursor = page.next_cursor
+            if not cursor:
+                break
+
+        self.assertEqual(visited, expected)
+        self.assertEqual(
+            paginate(get_workflows_requests('tests'), 'garbage', 2),
+            paginate(get_workflows_requests('tests'), None, 2))
+
+    def test_filters(self):
+        """Tests filtering by status, requester and assignee group"""
+        submitted = create_request(self.john_doe, line_items=0)
+        initiated = create_request(self.jane_smith, line_items=0, submit=False)
+        url = reverse('workflow-detail', kwargs={'app_name': 'tests'})
+
+        for (params, expected) in (
+                ({}, [initiated, submitted]),
+                ({'status': 'Initiated'}, [initiated, submitted]),
+                ({'status': 'Completed'}, []),
+                ({'requester': 'jane_smith'}, [initiated]),
+                ({'group': 'Reviewer'}, [submitted]),
+                ({'updated_from': '2000-01-01', 'updated_to': '2000-01-02'},
+                 [])):
+            response = self.client.get(url, params)
+            self.assertEqual(
+                [request.id for request in response.context['requests']],
+                [request.id for request in expected], params)
+
+
+class TaskSequenceTests(WorkflowTestCase):
+    """Current task pointer and task sequence tests"""
+    def test_submit_and_rollback(self):
+        """Tests that submit and rollback maintain the current task"""
+        request = create_request(self.john_doe, line_items=0)
+        (initial, review) = request.tasks.order_by('sequence')
+
+        self.assertEqual([initial.sequence, review.sequence], [1, 2])
+        self.assertEqual(review.previous, initial)
+        self.assertTrue(review.is_active)
+        self.assertFalse(initial.is_active)
+
+        review.rollback()
+        request.refresh_from_db()
+        current = request.current_task
+
+        self.assertEqual(current.sequence, 3)
+        self.assertEqual(current.activity_ref, 'foo_activity')
+        self.assertEqual(current.activity.subject, 'Test')
+        self.assertEqual(current.previous.status, 'Rolled Back')
+        self.assertTrue(current.is_active)
+
+    def test_bulk_loaded_activities(self):
+        """Tests loading mixed activities with one query per model"""
+        for _ in range(3):
+            create_request(self.john_doe, line_items=0)
+        create_request(self.john_doe, line_items=0, submit=False)
+
+        # tasks, foo, corge
+        with self.assertNumQueries(3):
+            activities = [
+                task.activity for task in Task.objects.with_activities()]
+
+        self.assertEqual(
+            sorted(type(activity).__name__ for activity in activities),
+            ['Corge'] * 3 + ['Foo'] * 4)
+
+
+class PermissionTests(WorkflowTestCase):
+    """Access checks scoped to the target activity"""
+    def get(self, user, view, model, identifier):
+        """Returns response of the activity view for the user"""
+        self.client.force_login(user)
+        return self.client.get(reverse(view, kwargs={
+            'app_name': 'tests', 'model_name': model, 'pk': identifier}))
+
+    def test_instance_checks(self):
+        """Tests view/update checks against the target instance"""
+        request = create_request(self.john_doe, line_items=0)
+        foo = Foo.objects.get(task__request=request)
+        corge = Corge.objects.get(task__request=request)
+        other = User.objects.create_user('other', 'o@company.com', '1')
+
+        self.assertIn('object', self.get(
+            self.john_doe, 'view', 'Foo', foo.id).context)
+        self.assertIn('object', self.get(
+            self.jane_smith, 'view', 'Corge', corge.id).context)
+        self.assertNotIn('object', self.get(
+            other, 'view', 'Foo', foo.id).context)
+
+        # historical activity cannot be updated, current one can
+        self.assertNotIn('form', self.get(
+            self.john_doe, 'update', 'Foo', foo.id).context)
+        self.assertIn('form', self.get(
+            self.jane_smith, 'update', 'Corge', corge.id).context)
+        self.assertNotIn('form', self.get(
+            self.john_doe, 'update', 'Corge', corge.id).context)
+
+    def test_bulk_task_permissions(self):
+        """Tests button states computed for a page of tasks"""
+        create_request(self.john_doe, line_items=0)
+        initiated = create_request(self.john_doe, line_items=0, submit=False)
+        initiated.current_task.submit('tests', self.john_doe, 'corge_activity')
+        self.client.force_login(self.jane_smith)
+
+        with query_budget(None) as queries:
+            response = self.client.get(reverse(
+                'workflow-detail', kwargs={'app_name': 'tests'}))
+
+        # groups were kept in the session at login
+        group_queries = [sql for (_, sql) in queries.queries if (
+            'auth_user_groups' in sql)]
+        self.assertEqual(len(group_queries), 0)
+
+        permissions = {
+            task.activity_ref + '-' + str(bool(task.activity)): (
+                task.permissions) for request in response.context[
+                    'requests'] for task in request.tasks.all()}
+
+        self.assertEqual(
+            permissions['corge_activity-True'],
+            TaskPermissions(view=True, initiate=False, revise=True,
+                            rollback=True))
+        self.assertEqual(
+            permissions['corge_activity-False'],
+            TaskPermissions(view=False, initiate=True, revise=False,
+                            rollback=False))
+        self.assertEqual(
+            permissions['foo_activity-True'],
+            TaskPermissions(view=False, initiate=False, revise=False,
+                            rollback=False))
+
+    def test_delete_and_reinitiate(self):
+        """Tests that a task whose activity was deleted
+        can be initiated again"""
+        task = Task.objects.get(
+            request=create_request(self.john_doe, line_items=0),
+            activity_ref='corge_activity')
+        self.client.force_login(self.jane_smith)
+
+        response = self.client.post(reverse('delete', kwargs={
+            'app_name': 'tests', 'model_name': 'Corge',
+            'pk': task.activity_id}))
+        self.assertEqual(response.status_code, 302)
+        task.refresh_from_db()
+        self.assertIsNone(task.activity_id)
+        self.assertIsNone(task.activity_type_id)
+
+        response = self.client.get(reverse(
+            'workflow-detail', kwargs={'app_name': 'tests'}))
+        (listed,) = [item for item in response.context['requests'][
+            0].tasks.all() if item.id == task.id]
+        self.assertTrue(listed.permissions.initiate)
+
+        url = reverse('create', args=('tests', 'Corge', task.id))
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.post(url, {'grault': 'Example', 'thud': 1})
+        self.assertEqual(response.status_code, 302)
+        task.refresh_from_db()
+        self.assertEqual(
+            task.activity, Corge.objects.get(task=task))
+
+
+class RoleCacheTests(WorkflowTestCase):
+    """Role and user group resolution tests"""
+    def group_queries(self):
+        """Returns number of group lookups issued by the inbox"""
+        with query_budget(None) as queries:
+            self.client.get(reverse('inbox'))
+        return len([sql for (_, sql) in queries.queries if (
+            'auth_group' in sql and 'core_task' not in sql)])
+
+    def test_roles(self):
+        """Tests that roles resolve to groups without queries
+        until groups change"""
+        self.assertEqual(roles.resolve('Reviewer'), self.reviewer.id)
+        request = create_request(self.john_doe, line_items=0, submit=False)
+
+        with query_budget(None) as queries:
+            request.current_task.submit(
+                'tests', self.john_doe, 'corge_activity')
+        self.assertFalse([sql for (_, sql) in queries.queries if (
+            'auth_group' in sql)])
+
+        self.reviewer.delete()
+        reviewer = Group.objects.create(name='Reviewer')
+        self.assertEqual(roles.resolve('Reviewer'), reviewer.id)
+
+        reviewer.delete()
+        with self.assertRaises(Group.DoesNotExist):
+            roles.resolve('Reviewer')
+
+    def test_session_groups(self):
+        """Tests that the user's groups are kept in the session
+        until memberships or groups change"""
+        self.client.login(username='john_doe', password='12345')
+        self.assertEqual(self.group_queries(), 0)
+
+        self.reviewer.user_set.add(self.john_doe)
+        self.assertEqual(self.group_queries(), 1)
+        self.assertEqual(self.group_queries(), 0)
+
+        self.john_doe.groups.remove(self.reviewer)
+        self.assertEqual(self.group_queries(), 1)
+
+        self.submitter.name = 'Submitters'
+        self.submitter.save()
+        self.assertEqual(self.group_queries(), 1)
+        self.assertEqual(self.group_queries(), 0)
+
+    def test_other_processes(self):
+        """Tests that roles cleared by another process sharing
+        the cache are resolved again"""
+        other = RoleCache()
+        self.assertEqual(roles.resolve('Reviewer'), self.reviewer.id)
+        self.assertEqual(other.resolve('Reviewer'), self.reviewer.id)
+
+        Group.objects.filter(id=self.reviewer.id).update(name='Former')
+        other.clear()
+        with self.assertRaises(Group.DoesNotExist):
+            roles.resolve('Reviewer')
+
+    @override_settings(ACTIVFLOW_GROUPS_TIMEOUT=0.5)
+    def test_versions_expire(self):
+        """Tests that changes made without signals (or in other
+        processes not sharing the cache) are seen once the
+        versions expired"""
+        roles.clear()
+        self.client.login(username='john_doe', password='12345')
+        self.assertEqual(roles.resolve('Reviewer'), self.reviewer.id)
+
+        Group.objects.filter(id=self.reviewer.id).update(name='Former')
+        User.groups.through.objects.create(
+            user=self.john_doe, group=self.reviewer)
+        self.assertEqual(roles.resolve('Reviewer'), self.reviewer.id)
+        self.assertEqual(self.group_queries(), 0)
+
+        time.sleep(0.6)
+        with self.assertRaises(Group.DoesNotExist):
+            roles.resolve('Reviewer')
+        self.assertEqual(self.group_queries(), 1)
+
+    def test_check(self):
+        """Tests warning of versions never expiring in a
+        cache local to the process"""
+        self.assertEqual(check_groups_cache(None), [])
+        with override_settings(ACTIVFLOW_GROUPS_TIMEOUT=None):
+            self.assertEqual([warning.id for warning in check_groups_cache(
+                None)], ['activflow.W001'])
+
+
+class RuleEngineTests(WorkflowTestCase):
+    """Transition rule evaluation tests"""
+    def setUp(self):
+        """Test Setup"""
+        super().setUp()
+        self.foo = create_request(
+            self.john_doe, line_items=1, submit=False
+        ).current_task.activity
+        self.evaluated = []
+        rule_evaluated.connect(self.receiver, sender=Foo)
+        self.addCleanup(rule_evaluated.disconnect, self.receiver, sender=Foo)
+        self.addCleanup(results.clear)
+        results.clear()
+
+    def receiver(self, sender, rule, activity, result, seconds, **kwargs):
+        """Records evaluated rules"""
+        self.evaluated.append((rule_name(rule), activity.pk, result))
+
+    def test_memoized(self):
+        """Tests that results are memoized per activity version
+        and values of the declared fields"""
+        @depends_on(fields=['bar'])
+        def rule(activity):
+            """Declares bar only"""
+            return activity.bar != 'Sample'
+
+        def evaluated(expected):
+            """Evaluates the rule, returns number of evaluations"""
+            self.assertEqual(evaluate([(self.foo, {
+                'corge_activity': rule})])[0]['corge_activity'], expected)
+            return len(self.evaluated)
+
+        self.assertEqual(evaluated(True), 1)
+        self.assertEqual(evaluated(True), 1)
+        self.foo.baz = 'NW'
+        self.assertEqual(evaluated(True), 1)
+        self.foo.bar = 'Sample'
+        self.assertEqual(evaluated(False), 2)
+        self.foo.bar = 'Example'
+        self.assertEqual(evaluated(True), 2)
+        self.foo.save()
+        self.assertEqual(evaluated(True), 3)
+
+        with override_settings(ACTIVFLOW_RULE_CACHE_SIZE=0):
+            results.clear()
+            self.assertEqual(evaluated(True), 4)
+            self.assertEqual(evaluated(True), 5)
+
+    def test_views(self):
+        """Tests that update pages reuse results of the activity
+        version and submissions evaluate the saved version"""
+        client = Client()
+        client.force_login(self.john_doe)
+        url = reverse('update', args=('tests', 'Foo', self.foo.id))
+
+        for _ in range(2):
+            self.assertEqual(client.get(url).context['next'], [
+                'corge_activity'])
+        self.assertEqual(self.evaluated, [
+            ('foo_to_corge', self.foo.id, True)])
+
+        response = client.post(url, activity_post_data(
+            lines=0, bar='Sample', submit='corge_activity'))
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertEqual(self.evaluated[1:], [
+            ('foo_to_corge', self.foo.id, False)])
+
+    def test_prefetch(self):
+        """Tests that declared relations are prefetched once
+        for all activities of a batch"""
+        @depends_on(relations=['lines', 'morelines'])
+        def rule(activity):
+            """Reads related items"""
+            return len(activity.lines.all()) == len(activity.morelines.all())
+
+        create_request(self.john_doe, line_items=0, submit=False)
+        foos = list(Foo.objects.all())
+
+        with self.assertNumQueries(2):
+            outcomes = evaluate([(foo, {'corge_activity': rule}) for foo in (
+                foos)])
+        self.assertEqual(outcomes, [{'corge_activity': True}] * 2)
+
+        with self.assertNumQueries(0):
+            evaluate([(foo, {'corge_activity': rule}) for foo in foos])
+
+    def test_instrumentation(self):
+        """Tests that every evaluated rule is timed"""
+        metrics.enabled = True
+        self.addCleanup(setattr, metrics, 'enabled', False)
+        self.addCleanup(metrics.clear)
+
+        self.foo.next_activity()
+        self.foo.next_activity()
+
+        self.assertEqual(metrics.operations['rule.foo_to_corge'][0], 1)
+        self.assertEqual(metrics.operations['rules.next_activity'][0], 2)
+        self.assertIn('operation="rule.foo_to_corge"', metrics.render())
+
+
+class StubService(ThreadingMixIn, HTTPServer):
+    """Local HTTP server of service stubs"""
+    daemon_threads = True
+
+
+class StubServiceHandler(BaseHTTPRequestHandler):
+    """Local pricing/compliance service stub: GET /<delay>/<status>
+    answers with the status after delay seconds"""
+    def do_GET(self):
+        """Answers the request"""
+        (delay, status) = self.path.strip('/').split('/')
+        time.sleep(float(delay))
+        self.send_response(int(status))
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        """Keeps test output quiet"""
+
+
+class ConcurrentRuleTests(WorkflowTestCase):
+    """Concurrent evaluation of I/O-bound transition rules"""
+    def setUp(self):
+        """Test Setup"""
+        super().setUp()
+        self.foo = create_request(
+            self.john_doe, line_items=0, submit=False
+        ).current_task.activity
+
+        server = StubService(('127.0.0.1', 0), StubServiceHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = 'http://127.0.0.1:{}'.format(server.server_port)
+
+        self.errors = []
+        rule_evaluated.connect(self.receiver, sender=Foo)
+        self.addCleanup(rule_evaluated.disconnect, self.receiver, sender=Foo)
+        self.addCleanup(results.clear)
+        results.clear()
+
+    def receiver(self, sender, error, **kwargs):
+        """Records errors replaced by fallback results"""
+        self.errors.append(type(error) if error else None)
+
+    def service_rule(self, delay, status=200, **options):
+        """Returns an I/O-bound rule calling the stub service"""
+        url = '{}/{}/{}'.format(self.url, delay, status)
+
+        @io_bound(**options)
+        def rule(activity):
+            """Approved by the service"""
+            with urlopen(url) as response:
+                return response.status == 200
+        return rule
+
+    def timed(self, rules):
+        """Returns (results, seconds) of the rules evaluation"""
+        start = time.perf_counter()
+        outcome = evaluate([(self.foo, rules)])[0]
+        return (outcome, time.perf_counter() - start)
+
+    def test_concurrent(self):
+        """Tests that I/O-bound rules run concurrently once workers
+        are configured, inline otherwise"""
+        rules = {'corge_activity': self.service_rule(0.2), 'grault': (
+            self.service_rule(0.2)), 'garply': foo_to_corge}
+
+        with override_settings(ACTIVFLOW_RULE_WORKERS=2):
+            (outcome, seconds) = self.timed(rules)
+        self.assertEqual(outcome, dict.fromkeys(rules, True))
+        self.assertLess(seconds, 0.35)
+
+        results.clear()
+        (outcome, seconds) = self.timed(rules)
+        self.assertEqual(outcome, dict.fromkeys(rules, True))
+        self.assertGreaterEqual(seconds, 0.4)
+        self.assertEqual(self.errors, [None] * 6)
+
+    @override_settings(ACTIVFLOW_RULE_WORKERS=2)
+    def test_fallback(self):
+        """Tests that rules timing out or failing yield their
+        fallback result, which is not memoized"""
+        rules = {
+            'corge_activity': self.service_rule(
+                0.5, timeout=0.1, fallback=True),
+            'grault': self.service_rule(0, status=503),
+            'garply': self.service_rule(0)}
+
+        (outcome, seconds) = self.timed(rules)
+        self.assertEqual(outcome, {
+            'corge_activity': True, 'grault': False, 'garply': True})
+        self.assertLess(seconds, 0.4)
+        self.assertEqual(self.errors, [futures.TimeoutError, HTTPError, None])
+
+        self.timed(rules)
+        self.assertEqual(self.errors[3:], [futures.TimeoutError, HTTPError])
+
+    @override_settings(ACTIVFLOW_RULE_WORKERS=1)
+    def test_saturated(self):
+        """Tests that rules yield their fallback at once while every
+        worker is held by calls which timed out"""
+        released = threading.Event()
+        self.addCleanup(released.set)
+
+        @io_bound(timeout=0.1, fallback=True)
+        def hung(activity):
+            """Blocked until released"""
+            return not released.wait(5)
+
+        rules = {'corge_activity': hung}
+        (outcome, seconds) = self.timed(rules)
+        self.assertEqual(outcome, {'corge_activity': True})
+        self.assertEqual(self.errors, [futures.TimeoutError])
+
+        (outcome, seconds) = self.timed(rules)
+        self.assertEqual(outcome, {'corge_activity': True})
+        self.assertLess(seconds, 0.05)
+        self.assertEqual(self.errors[1:], [PoolSaturated])
+
+        released.set()
+        for _ in range(50):
+            if not executor.saturated():
+                break
+            time.sleep(0.01)
+        rules = {'corge_activity': self.service_rule(0)}
+        self.assertEqual(self.timed(rules)[0], {'corge_activity': True})
+        self.assertEqual(self.errors[2:], [None])
+
+    def test_coroutines(self):
+        """Tests that coroutine rules are awaited concurrently,
+        within their timeout"""
+        def service_rule(delay, **options):
+            """Returns a coroutine rule calling the stub service"""
+            async def rule(activity):
+                """Approved by the service"""
+                (reader, writer) = await asyncio.open_connection(
+                    '127.0.0.1', int(self.url.rsplit(':', 1)[1]))
+                writer.write('GET /{}/200 HTTP/1.0\r\n\r\n'.format(
+                    delay).encode())
+                status = await reader.readline()
+                writer.close()
+                return b' 200 ' in status
+            return io_bound(**options)(rule) if options else rule
+
+        rules = {
+            'corge_activity': service_rule(0.2),
+            'grault': service_rule(0.2),
+            'garply': service_rule(0.5, timeout=0.1, fallback=True)}
+
+        (outcome, seconds) = self.timed(rules)
+        self.assertEqual(outcome, dict.fromkeys(rules, True))
+        self.assertLess(seconds, 0.35)
+        self.assertEqual(self.errors, [None, None, asyncio.TimeoutError])
+
+
+class HistoryQueryTests(WorkflowTestCase):
+    """Query cost of the request history widget"""
+    def test_query_budget(self):
+        """Tests that history cost does not grow with tasks"""
+        request = create_request(self.john_doe, line_items=3)
+
+        def grow(size):
+            """Rolls back and resubmits the request up to size tasks"""
+            while request.tasks.count() < size:
+                request.refresh_from_db()
+                request.current_task.rollback()
+                request.refresh_from_db()
+                request.current_task.submit(
+                    'tests', self.john_doe, 'corge_activity')
+                Corge(grault='Example', thud=1).assign_task(
+                    request.tasks.latest('sequence').id)
+
+        def history(budget):
+            """Renders the history"""
+            loaded = Request.objects.get(id=request.id)
+            with budget:
+                html = render_to_string('core/widgets/history.html', {
+                    'request': loaded, 'app_title': 'tests'})
+            self.assertIn('Plugh', html)
+
+        # tasks, foo, corge, foo lines, foo more lines
+        self.assertConstantQueries(
+            grow, {'history': (5, history)}, (2, 8))
+
+
+class GlobalContextTests(WorkflowTestCase):
+    """Global template context tests"""
+    def setUp(self):
+        """Test Setup"""
+        super().setUp()
+        self.client.login(username='john_doe', password='12345')
+
+    def test_context_from_resolved_url(self):
+        """Tests values derived from the resolved URL"""
+        response = self.client.get(reverse('create', kwargs={
+            'app_name': 'tests', 'model_name': 'Foo', 'pk': 'Initial'}))
+
+        self.assertEqual(response.context['app_title'], 'tests')
+        self.assertEqual(response.context['entity_title'], 'Foo')
+        self.assertEqual(response.context['identifier'], 'Initial')
+        self.assertEqual(response.context['activity_title'], 'Foo Activity')
+
+        response = self.client.get(reverse('workflows'))
+
+        self.assertIsNone(response.context['app_title'])
+        self.assertIsNone(response.context['activity_title'])
+
+
+class InboxTests(WorkflowTestCase):
+    """Cross-workflow task inbox tests"""
+    def test_open_tasks(self):
+        """Tests that inbox lists open tasks of the user's groups"""
+        submitted = create_request(self.john_doe, line_items=0)
+        initiated = create_request(self.john_doe, line_items=0, submit=False)
+
+        self.client.login(username='john_doe', password='12345')
+        tasks = self.client.get(reverse('inbox-json')).json()['tasks']
+
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual(tasks[0]['request'], initiated.id)
+        self.assertEqual(tasks[0]['activity'], 'Foo Activity')
+        self.assertEqual(tasks[0]['url'], reverse('update', args=(
+            'tests', 'Foo', initiated.current_task.activity_id)))
+
+        self.client.login(username='jane_smith', password='12345')
+        tasks = self.client.get(reverse('inbox-json')).json()['tasks']
+
+        self.assertEqual([task['request'] for task in tasks], [submitted.id])
+        self.assertEqual(tasks[0]['workflow'], 'Test Workflow')
+        self.assertEqual(tasks[0]['requester'], 'john_doe')
+
+        response = self.client.get(reverse('inbox'))
+        self.assertContains(response, 'Corge Activity')
+
+    def test_query_budget(self):
+        """Tests that inbox cost does not grow with tasks"""
+        self.client.login(username='jane_smith', password='12345')
+
+        def grow(size):
+            """Creates requests up to the size"""
+            for _ in range(size - Request.objects.count()):
+                create_request(self.john_doe, line_items=0)
+
+        def inbox(budget):
+            """Renders the inbox"""
+            with budget:
+                response = self.client.get(reverse('inbox'))
+            self.assertContains(response, 'Corge Activity')
+
+        # session, user, tasks, corge (groups are kept in the session)
+        self.assertConstantQueries(grow, {'inbox': (4, inbox)}, (1, 11))
+
+
+class BulkInitiationTests(WorkflowTestCase):
+    """Bulk request initiation tests"""
+    @staticmethod
+    def payload(bar='Example', lines=1):
+        """Returns an initial activity payload"""
+        return {
+            'subject': 'Bulk', 'bar': bar, 'baz': 'WL', 'qux': '',
+            'FooLineItem': [{'plugh': 'Abc', 'thud': 'GR'}] * lines
+        }
+
+    def test_initiate_requests(self):
+        """Tests persisted requests, tasks, activities and errors"""
+        rows = [self.payload(), self.payload(bar='lower'),
+                self.payload(lines=2), {'subject': 'Bulk'}]
+
+        result = initiate_requests('tests', self.john_doe, rows, 2)
+
+        self.assertEqual(sorted(result.created), [0, 2])
+        self.assertEqual(sorted(result.errors), [1, 3])
+        self.assertIn('bar', result.errors[1])
+        self.assertIn('baz', result.errors[3])
+
+        for (index, lines) in ((0, 1), (2, 2)):
+            request = Request.objects.get(id=result.created[index])
+            task = request.current_task
+            self.assertEqual(task.sequence, 1)
+            self.assertEqual(task.status, 'In Progress')
+            self.assertEqual(task.assignee.name, 'Submitter')
+            self.assertEqual(task.activity.task_id, task.id)
+            self.assertEqual(task.activity.lines.count(), lines)
+            self.assertTrue(task.activity.is_initial)
+
+    def test_query_budget(self):
+        """Tests that cost of a chunk does not grow with its rows"""
+        rows = []
+
+        def grow(size):
+            """Sets the number of rows"""
+            rows[:] = [self.payload(lines=2) for _ in range(size)]
+
+        def initiate(budget):
+            """Initiates requests of the rows"""
+            with budget:
+                result = initiate_requests('tests', self.john_doe, rows)
+            self.assertEqual(len(result.created), len(rows))
+
+        initiate_requests('tests', self.john_doe, [self.payload()])
+
+        self.assertConstantQueries(
+            grow, {'initiate': (11, initiate)}, (1, 20))
+
+    def test_endpoint(self):
+        """Tests JSON endpoint and access check"""
+        url = reverse('bulk-initiate', args=['tests'])
+        self.client.login(username='john_doe', password='12345')
+
+        response = self.client.post(
+            url, json.dumps([self.payload(), {}]),
+            content_type='application/json')
+        self.assertEqual(list(response.json()['created']), ['0'])
+        self.assertEqual(list(response.json()['errors']), ['1'])
+
+        response = self.client.post(
+            url, json.dumps([dict(self.payload(), FooLineItem=items) for (
+                items) in ('x', ['x'])]), content_type='application/json')
+        self.assertEqual(response.json()['errors'], dict.fromkeys(
+            ['0', '1'], {'FooLineItem': ['Expected a list of objects']}))
+
+        response = self.client.post(
+            url, 'garbage', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        self.client.login(username='jane_smith', password='12345')
+        response = self.client.post(
+            url, json.dumps([self.payload()]),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Request.objects.count(), 1)
+
+    def test_command(self):
+        """Tests management command"""
+        with NamedTemporaryFile('w', suffix='.jsonl') as rows:
+            rows.write('\n'.join(json.dumps(row) for row in (
+                self.payload(), self.payload(bar='lower'), ['Bulk'],
+                dict(self.payload(), FooLineItem='x'),
+                dict(self.payload(), FooLineItem=['x']))))
+            rows.flush()
+            (stdout, stderr) = (StringIO(), StringIO())
+            call_command(
+                'initiate_requests', 'tests', rows.name,
+                user='john_doe', stdout=stdout, stderr=stderr)
+
+        self.assertIn('1 requests initiated, 4 rows rejected',
+                      stdout.getvalue())
+        self.assertIn('row 2', stderr.getvalue())
+        self.assertIn('row 3: {"__all__": ["Expected an object"]}',
+                      stderr.getvalue())
+        for row in (4, 5):
+            self.assertIn('row {}: {{"FooLineItem": ["Expected a list of '
+                          'objects"]}}'.format(row), stderr.getvalue())
+        self.assertEqual(Foo.objects.get().lines.count(), 1)
+
+
+class BulkSubmitTests(WorkflowTestCase):
+    """Bulk task submission tests"""
+    def test_submit_tasks(self):
+        """Tests submitted tasks, rejected tasks and new tasks"""
+        requests = [create_request(
+            self.john_doe, line_items=0, submit=False) for _ in range(3)]
+        Foo.objects.filter(task__request=requests[1]).update(bar='Sample')
+        submitted = create_request(self.john_doe, line_items=0)
+        tasks = [request.current_task_id for request in requests]
+
+        result = submit_tasks('tests', self.john_doe, tasks + [
+            submitted.current_task_id], 'corge_activity')
+
+        self.assertEqual(sorted(result.created), [tasks[0], tasks[2]])
+        self.assertEqual(
+            result.errors[tasks[1]],
+            {'__all__': ['Transition rule is not satisfied']})
+        self.assertIn(submitted.current_task_id, result.errors)
+
+        for request in (requests[0], requests[2]):
+            request.refresh_from_db()
+            task = request.current_task
+            self.assertEqual(task.id, result.created[task.previous.id])
+            self.assertEqual(task.sequence, 2)
+            self.assertEqual(task.activity_ref, 'corge_activity')
+            self.assertEqual(task.status, 'Not Started')
+            self.assertEqual(task.assignee.name, 'Reviewer')
+            self.assertEqual(task.previous.status, 'Completed')
+
+        requests[1].refresh_from_db()
+        self.assertEqual(requests[1].current_task_id, tasks[1])
+
+    def test_query_budget(self):
+        """Tests that submission cost does not grow with tasks"""
+        tasks = []
+
+        def grow(size):
+            """Creates the number of tasks to submit"""
+            tasks[:] = [create_request(
+                self.john_doe, line_items=0, submit=False
+            ).current_task_id for _ in range(size)]
+
+        def submit(budget):
+            """Submits the tasks"""
+            with budget:
+                result = submit_tasks(
+                    'tests', self.john_doe, tasks, 'corge_activity')
+            self.assertEqual(len(result.created), len(tasks))
+
+        self.assertConstantQueries(grow, {'submit': (9, submit)}, (1, 10))
+
+    def test_endpoint(self):
+        """Tests JSON endpoint and assignee check"""
+        task = create_request(
+            self.john_doe, line_items=0, submit=False).current_task_id
+        url = reverse('bulk-submit', args=['tests'])
+
+        self.client.login(username='jane_smith', password='12345')
+        response = self.client.post(url, json.dumps({
+            'tasks': [task], 'transition': 'corge_activity'
+        }), content_type='application/json')
+        self.assertEqual(list(response.json()['errors']), [str(task)])
+
+        self.client.login(username='john_doe', password='12345')
+        response = self.client.post(url, json.dumps({
+            'tasks': [task], 'transition': 'unknown'
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(reverse(
+            'bulk-submit', args=['unknown']), json.dumps({
+                'tasks': [task], 'transition': 'corge_activity'
+            }), content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': 'Unknown workflow'})
+
+        response = self.client.post(url, json.dumps({
+            'tasks': [task], 'transition': 'corge_activity'
+        }), content_type='application/json')
+        self.assertEqual(list(response.json()['created']), [str(task)])
+
+
+class ExportTests(WorkflowTestCase):
+    """Streaming export tests"""
+    @staticmethod
+    def read(fmt='ndjson', gzipped=False, chunk_size=2000):
+        """Returns the decoded export"""
+        data = b''.join(export('tests', fmt, gzipped, chunk_size))
+        return (gzip.decompress(data) if gzipped else data).decode()
+
+    def test_ndjson(self):
+        """Tests records of tasks and activity data"""
+        create_request(self.john_doe, line_items=2)
+        create_request(self.john_doe, line_items=0, submit=False)
+
+        rows = [json.loads(line) for line in self.read().splitlines()]
+
+        self.assertEqual(
+            [(row['request_id'], row['sequence']) for row in rows],
+            list(Task.objects.order_by('request_id', 'sequence').values_list(
+                'request_id', 'sequence')))
+        self.assertEqual(rows[0]['requester'], 'john_doe')
+        self.assertEqual(rows[0]['Foo.bar'], 'Example')
+        self.assertEqual(rows[0]['Foo.FooLineItem'], [
+            {'plugh': 'Abc', 'thud': 'GR'}] * 2)
+        self.assertNotIn('Foo.creation_date', rows[1])
+        self.assertEqual(rows[1]['Corge.grault'], 'Example')
+        self.assertEqual(self.read(gzipped=True), self.read())
+
+    def test_csv(self):
+        """Tests CSV header and rows"""
+        create_request(self.john_doe, line_items=1)
+
+        rows = list(csv.DictReader(StringIO(self.read('csv'))))
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['Foo.subject'], 'Test')
+        self.assertEqual(rows[0]['Corge.grault'], '')
+        self.assertEqual(json.loads(rows[0]['Foo.FooMoreLineItem']), [
+            {'plughmore': 'Abc', 'thudmore': 'GR'}])
+        self.assertEqual(rows[1]['Corge.thud'], '1')
+
+    def test_query_budget(self):
+        """Tests that queries grow with chunks, not with tasks"""
+        for _ in range(5):
+            create_request(self.john_doe, line_items=1)
+
+        # tasks, then per chunk: foo, corge, foo lines, foo more lines
+        with self.assertQueryBudget(5):
+            self.read(chunk_size=10)
+        with self.assertQueryBudget(1 + 3 * 4):
+            self.read(chunk_size=4)
+
+    def test_endpoint_and_command(self):
+        """Tests streaming response, staff check and command"""
+        create_request(self.john_doe, line_items=0)
+        client = Client()
+        client.login(username='john_doe', password='12345')
+        url = reverse('export', args=['tests'])
+
+        self.assertTemplateUsed(client.get(url), 'core/denied.html')
+
+        User.objects.filter(id=self.john_doe.id).update(is_staff=True)
+        response = client.get(url, {'format': 'csv', 'gzip': '1'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)).decode(),
+            self.read('csv'))
+
+        with NamedTemporaryFile(suffix='.ndjson') as output:
+            call_command('export_requests', 'tests', output=output.name)
+            self.assertEqual(output.read().decode(), self.read())
+
+
+class InstrumentationTests(WorkflowTestCase):
+    """Query count and latency instrumentation tests"""
+    def setUp(self):
+        """Test Setup"""
+        super().setUp()
+        metrics.clear()
+
+    def tearDown(self):
+        """Test Teardown"""
+        metrics.enabled = False
+        metrics.clear()
+
+    def test_disabled(self):
+        """Tests that nothing is recorded by default"""
+        client = Client()
+        client.login(username='john_doe', password='12345')
+        response = client.get(reverse('workflow-detail', args=['tests']))
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(client.get(reverse('metrics')).status_code, 404)
+        self.assertFalse(metrics.enabled)
+
+    @override_settings(ACTIVFLOW_METRICS=True, ACTIVFLOW_SERVER_TIMING=True)
+    def test_metrics(self):
+        """Tests Server-Timing header and Prometheus metrics"""
+        request = create_request(self.john_doe, line_items=1)
+        client = Client()
+        client.login(username='john_doe', password='12345')
+
+        with query_budget(None) as queries:
+            response = client.get(reverse('workflow-detail', args=['tests']))
+
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn(
+            '"{} queries"'.format(len(queries)), response['Server-Timing'])
+
+        client.get(reverse('view', args=[
+            'tests', 'Foo', request.tasks.get(sequence=1).activity_id]))
+        request.current_task.rollback()
+
+        text = client.get(reverse('metrics')).content.decode()
+
+        self.assertIn(
+            'activflow_view_requests_total{view="WorkflowDetail"} 1', text)
+        self.assertIn('activflow_view_queries_total{{view="WorkflowDetail"}} '
+                      '{}'.format(len(queries)), text)
+        self.assertIn('activflow_view_template_seconds_total{'
+                      'view="ViewActivity"}', text)
+        self.assertIn('activflow_operation_calls_total{'
+                      'operation="tags.activity_data"} 2', text)
+        self.assertIn('activflow_operation_calls_total{'
+                      'operation="task.rollback"} 1', text)
+
+
+def activity_post_data(lines=1, **fields):
+    """Returns POST data of a Foo form with line items"""
+    data = {'subject': 'Test', 'bar': 'Example', 'baz': 'WL', 'qux': ''}
+    data.update(fields)
+
+    for (prefix, suffix) in (('FooLineItemForm', ''), (
+            'FooMoreLineItemForm', 'more')):
+        data.update({
+            prefix + '-TOTAL_FORMS': lines,
+            prefix + '-INITIAL_FORMS': 0,
+            prefix + '-MIN_NUM_FORMS': 0,
+            prefix + '-MAX_NUM_FORMS': 1000})
+        for index in range(lines):
+            data['{}-{}-plugh{}'.format(prefix, index, suffix)] = 'Abc'
+            data['{}-{}-thud{}'.format(prefix, index, suffix)] = 'GR'
+
+    return data
+
+
+class FormsetPersistenceTests(WorkflowTestCase):
+    """Batched persistence of inline formsets"""
+    def setUp(self):
+        """Test Setup"""
+        super().setUp()
+        self.client.force_login(self.john_doe)
+
+    def create(self, lines):
+        """Returns (activity, queries) of a request initiation"""
+        with query_budget(None) as queries:
+            response = self.client.post(reverse(
+                'create', args=('tests', 'Foo', 'Initial')),
+                activity_post_data(lines=lines))
+        self.assertEqual(response.status_code, 302)
+        return (Foo.objects.latest('id'), len(queries))
+
+    def update(self, foo, changed=(), deleted=(), added=0, invalid=()):
+        """Returns (response, queries) of an update of the
+        foo's line items"""
+        items = list(foo.lines.order_by('id'))
+        data = activity_post_data(lines=0, save='Save')
+        prefix = 'FooLineItemForm'
+        data.update({
+            prefix + '-TOTAL_FORMS': len(items) + added,
+            prefix + '-INITIAL_FORMS': len(items)})
+
+        for (index, item) in enumerate(items):
+            data.update({
+                '{}-{}-id'.format(prefix, index): item.id,
+                '{}-{}-foo'.format(prefix, index): foo.id,
+                '{}-{}-plugh'.format(prefix, index): (
+                    'Changed' if index in changed else item.plugh),
+                '{}-{}-thud'.format(prefix, index): (
+                    'invalid' if index in invalid else item.thud)})
+            if index in deleted:
+                data['{}-{}-DELETE'.format(prefix, index)] = 'on'
+        for index in range(len(items), len(items) + added):
+            data.update({
+                '{}-{}-plugh'.format(prefix, index): 'Added',
+                '{}-{}-thud'.format(prefix, index): 'GR'})
+
+        with query_budget(None) as queries:
+            response = self.client.post(reverse(
+                'update', args=('tests', 'Foo', foo.id)), data)
+        self.assertEqual(response.status_code, 200 if invalid else 302)
+        return (response, len(queries))
+
+    def test_create(self):
+        """Tests that line items are inserted in bulk"""
+        self.create(0)  # resolves roles and content types
+        (_, few) = self.create(2)
+        (foo, many) = self.create(40)
+
+        self.assertEqual(few, many)
+        self.assertEqual(foo.lines.count(), 40)
+        self.assertEqual(foo.morelines.count(), 40)
+
+    def test_row_templates(self):
+        """Tests that pages carry the empty form of every formset for
+        rows to be added in the browser, with server side fallback"""
+        (foo, _) = self.create(1)
+        for url in (reverse('create', args=('tests', 'Foo', 'Initial')),
+                    reverse('update', args=('tests', 'Foo', foo.id))):
+            response = self.client.get(url)
+            for prefix in ('FooLineItemForm', 'FooMoreLineItemForm'):
+                self.assertContains(
+                    response, '<template id="{}-empty-form">'.format(prefix))
+                self.assertContains(
+                    response, 'data-formset="{}"'.format(prefix))
+            self.assertContains(response, 'FooLineItemForm-__prefix__-plugh')
+
+        data = activity_post_data(lines=1)
+        data['add-FooLineItem'] = 'Add'
+        response = self.client.post(reverse(
+            'create', args=('tests', 'Foo', 'Initial')), data)
+        self.assertEqual(
+            response.context['formsets'][0].total_form_count(), 2)
+
+    def test_update(self):
+        """Tests that only changed line items are written, in bulk"""
+        (foo, _) = self.create(40)
+        stamps = dict(foo.lines.values_list('id', 'last_updated'))
+
+        (_, unchanged) = self.update(foo)
+        self.assertEqual(dict(foo.lines.values_list(
+            'id', 'last_updated')), stamps)
+
+        (_, few) = self.update(foo, changed={0}, deleted={1}, added=1)
+        (_, many) = self.update(
+            foo, changed=set(range(20)), deleted={20, 21, 22}, added=5)
+        self.assertEqual(few, many)
+        self.assertEqual(unchanged + 3, many)
+
+        items = list(foo.lines.order_by('id'))
+        self.assertEqual(len(items), 40 - 1 - 3 + 1 + 5)
+        self.assertEqual(
+            [item.plugh for item in items].count('Changed'), 20)
+        self.assertEqual([item.plugh for item in items].count('Added'), 6)
+        self.assertTrue(all(item.last_updated > stamps[item.id] for item in (
+            items[:20])))
+        self.assertTrue(all(item.last_updated == stamps[item.id] for item in (
+            items[20:34])))
+
+    def test_invalid_update(self):
+        """Tests that rejected updates are validated once, without
+        a query per row, and rendered from the validated formsets"""
+        (foo, _) = self.create(2)
+        self.update(foo, invalid={1})  # caches the history fragments
+        (_, few) = self.update(foo, changed={0}, invalid={1})
+        foo.lines.bulk_create([FooLineItem(
+            foo=foo, plugh='Abc', thud='GR') for _ in range(38)])
+        (response, many) = self.update(
+            foo, changed=set(range(20)), invalid={1})
+
+        self.assertEqual(few, many)
+        self.assertIn('Select a valid choice', response.context[
+            'error_message'])
+        formset = response.context['formsets'][0]
+        self.assertEqual(formset.instance, foo)
+        self.assertEqual(formset.total_form_count(), 40)
+        self.assertEqual(formset.forms[1].errors.as_data()['thud'][
+            0].code, 'invalid_choice')
+        self.assertEqual(foo.lines.filter(plugh='Changed').count(), 0)
+
+
+class FragmentCacheTests(WorkflowTestCase):
+    """Rendered fragment caching tests"""
+    def setUp(self):
+        """Test Setup"""
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }, 'fragments': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': directory.name
+        }}, ACTIVFLOW_FRAGMENT_CACHE='fragments')
+        override.enable()
+        self.addCleanup(override.disable)
+
+        super().setUp()
+        self.request = create_request(self.john_doe)
+
+    def listing(self, user):
+        """Returns (response, queries) of the workflow listing"""
+        self.client.force_login(user)
+        with query_budget(None) as queries:
+            response = self.client.get(reverse(
+                'workflow-detail', kwargs={'app_name': 'tests'}))
+        return (response, len(queries))
+
+    def history(self):
+        """Returns (html, queries) of the request history"""
+        request = Request.objects.get(id=self.request.id)
+        with query_budget(None) as queries:
+            html = render_to_string('core/widgets/history.html', {
+                'request': request, 'app_title': 'tests'})
+        return (html, len(queries))
+
+    def test_listing(self):
+        """Tests that rows are rendered from cache on later hits"""
+        (response, cold) = self.listing(self.john_doe)
+        fragment = response.context['requests'][0].fragment
+        (response, warm) = self.listing(self.john_doe)
+
+        # activities of the tasks are only loaded to render misses
+        self.assertEqual(warm, cold - 2)
+        self.assertEqual(response.context['requests'][0].fragment, fragment)
+        self.assertIn('Test', fragment)
+        self.assertIn('form="rollback"', fragment)
+        self.assertNotIn('csrfmiddlewaretoken', fragment)
+        self.assertContains(response, 'csrfmiddlewaretoken', count=1)
+
+        # rows differ with the user's permissions
+        (response, _) = self.listing(self.jane_smith)
+        self.assertNotEqual(
+            response.context['requests'][0].fragment, fragment)
+
+    def test_invalidation(self):
+        """Tests that saving activities discards cached fragments"""
+        self.listing(self.john_doe)
+        self.assertEqual(self.history()[1], 5)
+        self.assertEqual(self.history()[1], 1)
+
+        foo = Foo.objects.get(task__request=self.request)
+        foo.subject = 'Changed'
+        foo.save()
+        corge = Corge.objects.get(task__request=self.request)
+        corge.grault = 'Altered'
+        corge.save()
+
+        (response, _) = self.listing(self.john_doe)
+        self.assertIn('Changed', response.context['requests'][0].fragment)
+        (html, queries) = self.history()
+        self.assertIn('Altered', html)
+        self.assertEqual(queries, 5)
+
+    @override_settings(ACTIVFLOW_FRAGMENT_CACHE=None)
+    def test_disabled(self):
+        """Tests rendering without fragment cache"""
+        self.assertIsNone(get_cache())
+        (first, _) = self.listing(self.john_doe)
+        (second, _) = self.listing(self.john_doe)
+
+        self.assertEqual(
+            first.context['requests'][0].fragment,
+            second.context['requests'][0].fragment)
+        self.assertEqual(self.history()[1], 5)
+        self.assertEqual(self.history()[1], 5)
+
+
+class SyntheticDataTests(TestCase):
+    """Synthetic data generator tests"""
+    @staticmethod
+    def dataset():
+        """Returns the generated requests and tasks as plain values"""
+        return (
+            list(Request.objects.order_by('id').values_list(
+                'module_ref', 'status', 'current_task', 'last_updated')),
+            list(Task.objects.order_by('id').values_list(
+                'request', 'sequence', 'activity_ref', 'status',
+                'activity_id')))
+
+    def test_generate(self):
+        """Tests consistency of the generated task chains"""
+        counts = Generator(
+            ['tests'], seed=1, rollback_rate=0.3).generate(50)
+
+        self.assertEqual(counts[Request], 50)
+        self.assertEqual(counts[Task], Task.objects.count())
+        self.assertEqual(counts[FooLineItem], FooLineItem.objects.count())
+        self.assertTrue(Task.objects.filter(status='Rolled Back').exists())
+
+        for request in Request.objects.prefetch_related('tasks'):
+            tasks = sorted(request.tasks.all(), key=lambda task: task.sequence)
+            self.assertEqual(
+                [task.sequence for task in tasks],
+                list(range(1, len(tasks) + 1)))
+            self.assertEqual(request.current_task_id, tasks[-1].id)
+            self.assertEqual(tasks[0].activity_ref, 'foo_activity')
+            for task in tasks:
+                if task.activity_id:
+                    self.assertEqual(task.activity.task_id, task.id)
+
+        # new rows follow the existing ones
+        Generator(['tests'], seed=1).generate(1)
+        self.assertEqual(Request.objects.count(), 51)
+
+    def test_deterministic(self):
+        """Tests that a seed always produces the same dataset"""
+        call_command('generate_requests', 20, seed=7, stdout=StringIO())
+        dataset = self.dataset()
+        Request.objects.all().delete()
+        Foo.objects.all().delete()
+        Corge.objects.all().delete()
+
+        call_command('generate_requests', 20, seed=7, stdout=StringIO())
+        (requests, tasks) = self.dataset()
+        self.assertEqual(dataset, (requests, tasks))
+
+
+@override_settings(ACTIVFLOW_FRAGMENT_CACHE=None)
+class QueryBudgetTests(WorkflowTestCase):
+    """Query budgets of core views and template tags, checked to stay
+    constant with 1, 10 and 100 requests (each with several tasks and
+    line items) and as many line items on the activity at hand,
+    rendered without the fragment cache"""
+    def setUp(self):
+        """Test Setup"""
+        super().setUp()
+        self.john_doe.is_staff = True
+        self.john_doe.save()
+
+        (self.submitter, self.reviewer) = (Client(), Client())
+        self.submitter.force_login(self.john_doe)
+        self.reviewer.force_login(self.jane_smith)
+
+        self.target = create_request(
+            self.john_doe, line_items=0, submit=False)
+        self.foo = self.target.current_task.activity
+
+    def grow(self, size):
+        """Grows requests and line items of the target to the size"""
+        for index in range(Request.objects.count() - 1, size):
+            request = create_request(self.john_doe, line_items=3)
+            if index % 2:  # rolled back and submitted again
+                request.current_task.rollback()
+                request.refresh_from_db()
+                request.current_task.submit(
+                    'tests', self.john_doe, 'corge_activity')
+
+        lines = self.foo.lines.count()
+        FooLineItem.objects.bulk_create([FooLineItem(
+            foo=self.foo, plugh='Abc', thud='GR'
+        ) for _ in range(lines, size)])
+
+    def reviewer_task(self):
+        """Returns a request waiting for the reviewer's Corge"""
+        request = create_request(self.john_doe, line_items=1, submit=False)
+        request.current_task.submit('tests', self.john_doe, 'corge_activity')
+        request.refresh_from_db()
+        return request
+
+    def views(self):
+        """Returns {name: (budget, action)} of the core views"""
+        def get(client, name, *args, **params):
+            """Returns action measuring a GET request"""
+            def action(measured):
+                """Issues the request"""
+                with measured:
+                    response = client.get(reverse(name, args=args), params)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                self.assertEqual(response.status_code, 200)
+            return action
+
+        def create_corge(measured):
+            """Initiates the reviewer activity"""
+            task = self.reviewer_task().current_task_id
+            with measured:
+                response = self.reviewer.post(reverse(
+                    'create', args=('tests', 'Corge', task)), {
+                        'grault': 'Example', 'thud': 1})
+            self.assertEqual(response.status_code, 302)
+
+        def create_foo(measured):
+            """Initiates a request"""
+            with measured:
+                response = self.submitter.post(reverse(
+                    'create', args=('tests', 'Foo', 'Initial')),
+                    activity_post_data(lines=2))
+            self.assertEqual(response.status_code, 302)
+
+        def save_foo(measured):
+            """Saves the target activity"""
+            with measured:
+                response = self.submitter.post(reverse(
+                    'update', args=('tests', 'Foo', self.foo.id)),
+                    activity_post_data(lines=0, save='Save'))
+            self.assertEqual(response.status_code, 302)
+
+        def submit_foo(measured):
+            """Submits an initial activity"""
+            foo = create_request(
+                self.john_doe, line_items=2, submit=False
+            ).current_task.activity
+            with measured:
+                response = self.submitter.post(reverse(
+                    'update', args=('tests', 'Foo', foo.id)),
+                    activity_post_data(lines=0, submit='corge_activity'))
+            self.assertRedirects(
+                response, reverse('workflow-detail', args=['tests']),
+                fetch_redirect_response=False)
+
+        def rollback(measured):
+            """Rolls back a reviewer task"""
+            task = self.reviewer_task().current_task_id
+            with measured:
+                response = self.reviewer.post(
+                    reverse('rollback', args=('tests', task)))
+            self.assertEqual(response.status_code, 302)
+
+        def bulk_initiate(measured):
+            """Initiates requests in bulk"""
+            with measured:
+                response = self.submitter.post(
+                    reverse('bulk-initiate', args=['tests']),
+                    json.dumps([BulkInitiationTests.payload()] * 2),
+                    content_type='application/json')
+            self.assertEqual(len(response.json()['created']), 2)
+
+        def bulk_submit(measured):
+            """Submits tasks in bulk"""
+            tasks = [create_request(
+                self.john_doe, line_items=0, submit=False
+            ).current_task_id for _ in range(2)]
+            with measured:
+                response = self.submitter.post(
+                    reverse('bulk-submit', args=['tests']), json.dumps({
+                        'tasks': tasks, 'transition': 'corge_activity'}),
+                    content_type='application/json')
+            self.assertEqual(len(response.json()['created']), 2)
+
+        foo = ('tests', 'Foo', self.foo.id)
+
+        return {
+            'workflows': (3, get(self.submitter, 'workflows')),
+            'workflow detail': (6, get(
+                self.submitter, 'workflow-detail', 'tests')),
+            'inbox': (4, get(self.reviewer, 'inbox')),
+            'inbox json': (4, get(self.reviewer, 'inbox-json')),
+            'create form (initial)': (2, get(
+                self.submitter, 'create', 'tests', 'Foo', 'Initial')),
+            'create (initial)': (18, create_foo),
+            'create (task)': (11, create_corge),
+            'update form': (12, get(self.submitter, 'update', *foo)),
+            'update (save)': (10, save_foo),
+            'update (submit)': (14, submit_foo),
+            'view': (10, get(self.submitter, 'view', *foo)),
+            'rollback': (17, rollback),
+            'bulk initiate': (15, bulk_initiate),
+            'bulk submit': (10, bulk_submit),
+            'export': (7, get(self.submitter, 'export', 'tests')),
+        }
+
+    def tags(self):
+        """Returns {name: (budget, action)} of the core template tags"""
+        def render(source, budget, **context):
+            """Returns action measuring a template render"""
+            def action(measured):
+                """Renders the template"""
+                template = Template('{% load core_tags %}' + source)
+                values = Context(dict(context, request=Request.objects.get(
+                    id=self.target.id)))
+                with measured:
+                    template.render(values)
+            return (budget, action)
+
+        def history(measured):
+            """Renders history of a request with several cycles"""
+            request = Request.objects.order_by('id')[1]
+            with measured:
+                render_to_string('core/widgets/history.html', {
+                    'request': request, 'app_title': 'tests'})
+
+        return {
+            'activity_data': render(
+                '{% activity_data foo "display" "related" as data %}'
+                '{% for name, items in data.items %}{{ items|length }}'
+                '{% endfor %}', 2, foo=self.foo, app_title='tests'),
+            'request_history': (5, history),
+            'activity titles': render(
+                '{% activity_title "foo_activity" "tests" %}'
+                '{% activity_friendly_name "corge_activity" "tests" %}', 0),
+        }
+
+    def test_views(self):
+        """Tests query budgets of core views"""
+        self.assertConstantQueries(self.grow, self.views())
+
+    def test_template_tags(self):
+        """Tests query budgets of core template tags"""
+        self.assertConstantQueries(self.grow, self.tags())
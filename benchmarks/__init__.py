@@ -0,0 +1,69 @@
+"""Benchmarks for the workflow engine
+
+Run a benchmark as a module from the project root, e.g.
+
+    python -m benchmarks.helpers
+"""
+
+import os
+import timeit
+from contextlib import contextmanager
+
+import django
+
+
+def setup():
+    """Configures django for standalone benchmark runs"""
+    settings = "activflow.settings.development"
+
+    if os.environ.get("ENV", None) == "staging":
+        settings = "activflow.settings.staging"
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings)
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """Runs the block against a freshly created test database"""
+    from django.test.utils import (
+        setup_databases,
+        setup_test_environment,
+        teardown_databases,
+        teardown_test_environment)
+
+    setup_test_environment()
+    config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(config, verbosity=0)
+        teardown_test_environment()
+
+
+def create_users():
+    """Creates demo groups and users, returns (submitter, reviewer)"""
+    from django.contrib.auth.models import Group, User
+
+    submitter = User.objects.create_user(
+        'john.doe', 'john@company.com', '12345')
+    reviewer = User.objects.create_user(
+        'jane.smith', 'jane@company.com', '12345')
+    Group.objects.create(name='Submitter').user_set.add(submitter)
+    Group.objects.create(name='Reviewer').user_set.add(reviewer)
+
+    return (submitter, reviewer)
+
+
+def measure(func, number=10000, repeat=5):
+    """Returns best time per call in microseconds"""
+    return min(timeit.repeat(
+        func, number=number, repeat=repeat)) / number * 1e6
+
+
+def report(title, results):
+    """Prints timings as a table"""
+    print(title)
+    width = max(len(name) for name in results)
+    for name, value in results.items():
+        print('  {0:<{1}}  {2:>10.2f} us'.format(name, width, value))
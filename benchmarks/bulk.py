@@ -0,0 +1,72 @@
+"""Request initiation throughput: one request per transaction
+through the engine API (as CreateActivity does) vs the bulk
+initiation API with different chunk sizes
+
+    python -m benchmarks.bulk [rows]
+"""
+
+import sys
+from timeit import default_timer
+
+from benchmarks import create_users, report, setup, test_database
+
+
+def payloads(count):
+    """Returns initial activity payloads with two line items each"""
+    return [{
+        'subject': 'Request {}'.format(index),
+        'bar': 'Example',
+        'baz': 'WL',
+        'qux': '',
+        'FooLineItem': [{'plugh': 'Abc', 'thud': 'GR'}] * 2
+    } for index in range(count)]
+
+
+def per_request(module, user, rows):
+    """Initiates requests one by one through the engine API"""
+    from django.db import transaction
+
+    from activflow.core.bulk import validate
+
+    for row in rows:
+        (form, formsets, _) = validate(module, 'Foo', row)
+        with transaction.atomic():
+            instance = form.save()
+            for formset in formsets:
+                for item in formset.save(commit=False):
+                    setattr(item, formset.fk.name, instance)
+                    item.save()
+            instance.initiate_request(user, module)
+
+
+def timed(func, count):
+    """Returns time per row in microseconds"""
+    start = default_timer()
+    func()
+    return (default_timer() - start) / count * 1e6
+
+
+def main():
+    """Entry Point"""
+    setup()
+
+    from activflow.core.bulk import initiate_requests
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    with test_database():
+        (submitter, _) = create_users()
+        rows = payloads(count)
+
+        results = {'per request': timed(
+            lambda: per_request('tests', submitter, rows), count)}
+        for chunk_size in (100, 500, 2000):
+            results['bulk, chunks of {}'.format(chunk_size)] = timed(
+                lambda: initiate_requests(
+                    'tests', submitter, rows, chunk_size), count)
+
+        report('Initiation cost per request ({} rows)'.format(count), results)
+
+
+if __name__ == '__main__':
+    main()
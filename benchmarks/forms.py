@@ -0,0 +1,74 @@
+"""Form class construction cost: per call vs cached classes,
+for the construction step alone and for create/update views"""
+
+from benchmarks import (
+    create_users,
+    measure,
+    report,
+    setup,
+    test_database
+)
+
+
+def construction(app, model):
+    """Times form/formset class construction"""
+    from activflow.core import helpers
+
+    results = {}
+    for operation in helpers.OPERATIONS:
+        results['{} (per call)'.format(operation)] = measure(
+            lambda: (helpers.build_form(app, model, operation),
+                     helpers.build_formsets(app, model, operation, 1)),
+            number=200)
+        results['{} (cached)'.format(operation)] = measure(
+            lambda: (helpers.form_class(app, model, operation),
+                     helpers.formset_classes(app, model, operation, 1)),
+            number=200)
+    return results
+
+
+def views(app, model):
+    """Times GET on create/update views"""
+    from django.test import Client
+    from django.urls import reverse
+
+    from activflow.core import helpers
+    from activflow.tests.models import Foo
+
+    (submitter, _) = create_users()
+    foo = Foo(subject='Test', bar='Example', baz='WL')
+    foo.initiate_request(submitter, app)
+
+    client = Client()
+    client.force_login(submitter)
+    urls = {
+        'create': reverse('create', args=(app, model, 'Initial')),
+        'update': reverse('update', args=(app, model, foo.id))
+    }
+
+    def uncached(url):
+        """Discards cached classes before the request"""
+        helpers.form_class.cache_clear()
+        helpers.formset_classes.cache_clear()
+        return client.get(url)
+
+    results = {}
+    for operation, url in urls.items():
+        results['{} view (per call)'.format(operation)] = measure(
+            lambda: uncached(url), number=50)
+        results['{} view (cached)'.format(operation)] = measure(
+            lambda: client.get(url), number=50)
+    return results
+
+
+def main():
+    """Entry Point"""
+    setup()
+    report('Class construction', construction('tests', 'Foo'))
+
+    with test_database():
+        report('Views', views('tests', 'Foo'))
+
+
+if __name__ == '__main__':
+    main()
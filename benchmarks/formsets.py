@@ -0,0 +1,151 @@
+"""Inline formset persistence with large formsets: one statement per
+row (formset.save()) vs batched inserts/updates/deletes (save_formset)
+for creation and for updates changing 10% and deleting 5% of the rows;
+CPU time of rejected (invalid) update submissions, rendered with their
+errors
+
+    python -m benchmarks.formsets [rows ...]
+"""
+
+import sys
+from time import process_time
+from timeit import default_timer
+
+from benchmarks import create_users, report, setup, test_database
+
+
+PREFIX = 'FooLineItemForm'
+
+
+def data(items, rows):
+    """Returns POST data of a Foo line item formset, updating the
+    existing items (if any) or creating new rows"""
+    if not items:
+        values = {PREFIX + '-TOTAL_FORMS': rows, PREFIX + '-INITIAL_FORMS': 0}
+        for index in range(rows):
+            values['{}-{}-plugh'.format(PREFIX, index)] = 'Abc'
+            values['{}-{}-thud'.format(PREFIX, index)] = 'GR'
+        return values
+
+    values = {
+        PREFIX + '-TOTAL_FORMS': len(items),
+        PREFIX + '-INITIAL_FORMS': len(items)}
+    for (index, item) in enumerate(items):
+        values.update({
+            '{}-{}-id'.format(PREFIX, index): item.id,
+            '{}-{}-foo'.format(PREFIX, index): item.foo_id,
+            '{}-{}-plugh'.format(PREFIX, index): (
+                'Changed' if index % 10 == 0 else item.plugh),
+            '{}-{}-thud'.format(PREFIX, index): item.thud})
+        if index % 20 == 1:
+            values['{}-{}-DELETE'.format(PREFIX, index)] = 'on'
+    return values
+
+
+def per_row(formset, instance):
+    """Persists the formset as FormHandler.save used to"""
+    if formset.instance.pk:
+        formset.save()
+        return
+    for obj in formset.save(commit=False):
+        obj.foo = instance
+        obj.save()
+
+
+def timed(save, foo, values, bound):
+    """Returns best time in microseconds of saving the bound
+    formset, each run being rolled back"""
+    from django.db import transaction
+
+    timings = []
+    for _ in range(3):
+        formset = bound(values)
+        assert formset.is_valid(), formset.errors
+        with transaction.atomic():
+            start = default_timer()
+            save(formset, foo)
+            timings.append(default_timer() - start)
+            transaction.set_rollback(True)
+    return min(timings) * 1e6
+
+
+def invalid(user, foo, items):
+    """Returns best CPU time in microseconds of the update view
+    rejecting a submission for one invalid line item"""
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.test import RequestFactory
+    from django.test.utils import override_settings
+    from django.urls import resolve, reverse
+
+    values = data(items, len(items))
+    values.update({
+        'subject': 'Test', 'bar': 'Example', 'baz': 'WL', 'qux': '',
+        'save': 'Save', '{}-0-thud'.format(PREFIX): 'invalid',
+        'FooMoreLineItemForm-TOTAL_FORMS': 0,
+        'FooMoreLineItemForm-INITIAL_FORMS': 0})
+    url = reverse('update', args=('tests', 'Foo', foo.id))
+    match = resolve(url)
+
+    timings = []
+    for _ in range(3):
+        # the view is called directly, as the test client's recording
+        # of rendered templates would outweigh the view itself
+        request = RequestFactory().post(url, values)
+        (request.user, request.session) = (user, SessionStore())
+        request.resolver_match = match
+        # large formsets exceed the default limit of 1000 fields;
+        # templates are cached (as in production) without DEBUG
+        with override_settings(
+                DATA_UPLOAD_MAX_NUMBER_FIELDS=None, DEBUG=False):
+            start = process_time()
+            response = match.func(request, *match.args, **match.kwargs)
+            timings.append(process_time() - start)
+        assert response.status_code == 200 and b'invalid' in (
+            response.content)
+    return min(timings) * 1e6
+
+
+def main():
+    """Entry Point"""
+    setup()
+
+    from activflow.core.bulk import save_formset
+    from activflow.core.helpers import formset_classes
+    from activflow.tests.models import Foo
+
+    sizes = [int(size) for size in sys.argv[1:]] or [500, 2000]
+
+    with test_database():
+        (submitter, _) = create_users()
+        foo = Foo(subject='Test', bar='Example', baz='WL')
+        foo.initiate_request(submitter, 'tests')
+        (create, _) = formset_classes('tests', 'Foo', 'create')
+        (update, _) = formset_classes('tests', 'Foo', 'update')
+
+        for rows in sizes:
+            foo.lines.all().delete()
+            results = {}
+            for (name, save) in (('per row', per_row), (
+                    'batched', save_formset)):
+                results['create, ' + name] = timed(
+                    save, foo, data([], rows), lambda values: create(
+                        values, prefix=PREFIX))
+
+            formset = create(data([], rows), prefix=PREFIX)
+            formset.is_valid()
+            save_formset(formset, foo)
+
+            items = list(foo.lines.order_by('id'))
+            for (name, save) in (('per row', per_row), (
+                    'batched', save_formset)):
+                results['update, ' + name] = timed(
+                    save, foo, data(items, rows), lambda values: update(
+                        values, instance=foo, prefix=PREFIX))
+
+            results['invalid update (CPU)'] = invalid(submitter, foo, items)
+
+            report('{} rows'.format(rows), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Workflow listing and request history latency without fragment
+cache, with a cold cache (every row/entry rendered and stored) and
+with a warm cache (hit path), on synthetic data
+
+    python -m benchmarks.fragments [requests]
+"""
+
+import sys
+
+from benchmarks import create_users, measure, report, setup, test_database
+
+
+def timings(listing, history):
+    """Returns latency of listing/history in the current setup"""
+    from django.core.cache import caches
+    from django.conf import settings
+
+    def cold(render):
+        """Renders with an emptied cache"""
+        alias = settings.ACTIVFLOW_FRAGMENT_CACHE
+        return lambda: (alias and caches[alias].clear(), render())
+
+    return {
+        'cold': (measure(cold(listing), number=20, repeat=3), measure(
+            cold(history), number=20, repeat=3)),
+        'warm': (measure(listing, number=20, repeat=3), measure(
+            history, number=20, repeat=3)),
+    }
+
+
+def main():
+    """Entry Point"""
+    setup()
+
+    from django.template.loader import render_to_string
+    from django.test import Client
+    from django.test.utils import override_settings
+    from django.urls import reverse
+
+    from activflow.core.models import Request
+    from activflow.core.synthetic import Generator
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    with test_database():
+        (submitter, _) = create_users()
+        Generator(['tests'], seed=42, lines=(2, 5)).generate(count)
+
+        client = Client()
+        client.force_login(submitter)
+        url = reverse('workflow-detail', kwargs={'app_name': 'tests'})
+        request = Request.objects.filter(tasks__sequence=4).first()
+
+        def listing():
+            """Renders the first page of the workflow listing"""
+            response = client.get(url)
+            assert response.status_code == 200
+            return response
+
+        def history():
+            """Renders history of a request with several tasks"""
+            return render_to_string('core/widgets/history.html', {
+                'request': request, 'app_title': 'tests'})
+
+        with override_settings(ACTIVFLOW_FRAGMENT_CACHE=None):
+            results = {'uncached': timings(listing, history)['cold']}
+        results.update(timings(listing, history))
+
+        report('Workflow listing (25 requests)', {
+            name: listing for (name, (listing, _)) in results.items()})
+        report('Request history ({} tasks)'.format(request.tasks.count()), {
+            name: history for (name, (_, history)) in results.items()})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Configuration helper call cost: import based lookups vs
+compiled registry"""
+
+from importlib import import_module
+
+from benchmarks import setup, measure, report
+
+
+def legacy_helpers():
+    """Returns helpers as implemented before the registry"""
+    from django.apps import apps
+
+    def workflow_config(module):
+        return import_module('{}.config'.format(
+            apps.get_app_config(module).name))
+
+    def flow_config(module):
+        return import_module('{}.flow'.format(
+            apps.get_app_config(module).name))
+
+    return {
+        'flow_config': flow_config,
+        'transition_config': lambda module, activity: flow_config(
+            module).FLOW[activity]['transitions'],
+        'activity_config': lambda module, model: workflow_config(
+            module).ACTIVITY_CONFIG[model],
+        'wysiwyg_config': lambda module, model: workflow_config(
+            module).WYSIWYG_CONFIG[model],
+        'form_config': lambda module, model: workflow_config(
+            module).FORM_CONFIG[model],
+        'activity_title': lambda module, ref: flow_config(
+            module).FLOW[ref]['model']().title,
+    }
+
+
+def compiled_helpers():
+    """Returns helpers backed by the compiled registry"""
+    from activflow.core import helpers
+
+    return {
+        'flow_config': helpers.flow_config,
+        'transition_config': helpers.transition_config,
+        'activity_config': helpers.activity_config,
+        'wysiwyg_config': helpers.wysiwyg_config,
+        'form_config': helpers.form_config,
+        'activity_title': lambda module, ref: helpers.flow_config(
+            module).activities[ref].title,
+    }
+
+
+def main():
+    """Entry Point"""
+    setup()
+    calls = {
+        'flow_config': ('tests',),
+        'transition_config': ('tests', 'foo_activity'),
+        'activity_config': ('tests', 'Foo'),
+        'wysiwyg_config': ('tests', 'Foo'),
+        'form_config': ('tests', 'Foo'),
+        'activity_title': ('tests', 'foo_activity'),
+    }
+
+    for title, implementation in (
+            ('Before (import_module)', legacy_helpers()),
+            ('After (registry)', compiled_helpers())):
+        report(title, {
+            name: measure(lambda: implementation[name](*args))
+            for name, args in calls.items()})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""Query plans and timings of the engine's access paths with
+the original single column foreign key indexes (before) and the
+composite indexes declared on Request and Task (after).
+
+Synthetic tables are seeded in a throwaway test database, SQLite
+by default or PostgreSQL with ENV=staging:
+
+    python -m benchmarks.indexes [requests]
+"""
+
+import random
+import sys
+from contextlib import contextmanager
+from datetime import timedelta
+
+from benchmarks import measure, report, setup, test_database
+
+
+MODULES = ('tests', 'procurement', 'leave', 'travel')
+TASKS_PER_REQUEST = 4
+BATCH_SIZE = 5000
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Lets bulk inserts keep given creation/update timestamps"""
+    fields = [field for model in models for field in model._meta.fields if (
+        getattr(field, 'auto_now', False) or getattr(
+            field, 'auto_now_add', False))]
+    flags = [(field.auto_now, field.auto_now_add) for field in fields]
+
+    for field in fields:
+        (field.auto_now, field.auto_now_add) = (False, False)
+    try:
+        yield
+    finally:
+        for (field, (auto_now, auto_now_add)) in zip(fields, flags):
+            (field.auto_now, field.auto_now_add) = (auto_now, auto_now_add)
+
+
+def seed(count):
+    """Seeds users, groups, requests and tasks"""
+    from django.contrib.auth.models import Group, User
+    from django.utils import timezone
+
+    from activflow.core.constants import REQUEST_STATUS, TASK_STATUS
+    from activflow.core.models import Request, Task
+
+    rng = random.Random(42)
+    now = timezone.now()
+    users = User.objects.bulk_create(
+        [User(id=index, username='user{}'.format(index))
+         for index in range(1, 51)])
+    groups = Group.objects.bulk_create(
+        [Group(id=index, name='group{}'.format(index))
+         for index in range(1, 11)])
+
+    with explicit_timestamps(Request, Task):
+        for start in range(1, count + 1, BATCH_SIZE):
+            (requests, tasks) = ([], [])
+            for identifier in range(start, min(start + BATCH_SIZE, count + 1)):
+                updated = now - timedelta(minutes=rng.randrange(10 ** 6))
+                requests.append(Request(
+                    id=identifier,
+                    requester=rng.choice(users),
+                    module_ref=rng.choice(MODULES),
+                    status=rng.choice(REQUEST_STATUS)[0],
+                    creation_date=updated,
+                    last_updated=updated))
+                for sequence in range(1, TASKS_PER_REQUEST + 1):
+                    tasks.append(Task(
+                        id=(identifier - 1) * TASKS_PER_REQUEST + sequence,
+                        request_id=identifier,
+                        sequence=sequence,
+                        assignee=rng.choice(groups),
+                        updated_by=rng.choice(users),
+                        activity_ref='activity',
+                        status=rng.choice(TASK_STATUS)[0],
+                        creation_date=updated,
+                        last_updated=updated))
+            Request.objects.bulk_create(requests)
+            Task.objects.bulk_create(tasks)
+
+
+def baseline_indexes():
+    """Returns the foreign key indexes of the original schema"""
+    from django.db.models import Index
+
+    from activflow.core.models import Request, Task
+
+    return [
+        (Request, Index(fields=['requester'], name='bench_request_user')),
+        (Task, Index(fields=['request'], name='bench_task_request')),
+        (Task, Index(fields=['assignee'], name='bench_task_assignee')),
+    ]
+
+
+def composite_indexes():
+    """Returns the indexes declared on the core models"""
+    from activflow.core.models import Request, Task
+
+    return [(model, index) for model in (Request, Task) for index in (
+        model._meta.indexes)]
+
+
+def switch(drop, create):
+    """Replaces one set of indexes with another"""
+    from django.db import connection
+
+    with connection.schema_editor() as editor:
+        for (model, index) in create:
+            editor.add_index(model, index)
+        for (model, index) in drop:
+            editor.remove_index(model, index)
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def queries(count):
+    """Returns querysets for the engine's access paths"""
+    from activflow.core.models import Request, Task
+    from activflow.core.pagination import encode_cursor, seek
+
+    listing = Request.objects.filter(module_ref='tests')
+    # modules are assigned at random, the listing holds about
+    # count / len(MODULES) requests
+    rows = listing.count()
+    cursor = encode_cursor(listing.order_by('-last_updated', '-id')[
+        min(rows - 1, 200 * 25)]) if rows else None
+    request_id = count // 2
+
+    return {
+        'listing page': lambda: listing.order_by(
+            '-last_updated', '-id')[:25],
+        # the keyset query of paginate(listing, cursor, 25)
+        'listing page 200': lambda: seek(listing, cursor)[:26],
+        'listing by status': lambda: listing.filter(
+            status='Completed').order_by('-last_updated', '-id')[:25],
+        'listing by requester': lambda: listing.filter(
+            requester_id=7).order_by('-last_updated', '-id')[:25],
+        'latest task of request': lambda: Task.objects.filter(
+            request_id=request_id).order_by('-id')[:1],
+        'open tasks of group': lambda: Task.objects.filter(
+            assignee_id__in=[3], status__in=['Not Started', 'In Progress']
+        ).order_by('-last_updated', '-id')[:25],
+    }
+
+
+def run(title, paths):
+    """Prints plans and timings of the access paths"""
+    timings = {}
+    for name, query in paths.items():
+        queryset = query()
+        if hasattr(queryset, 'explain'):
+            print('{} / {}\n  {}'.format(title, name, queryset.explain(
+            ).replace('\n', '\n  ')))
+        timings[name] = measure(lambda: list(query()), number=20, repeat=3)
+    report(title, timings)
+
+
+def main():
+    """Entry Point"""
+    setup()
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    with test_database():
+        seed(count)
+        paths = queries(count)
+
+        switch(composite_indexes(), baseline_indexes())
+        run('Before (foreign key indexes)', paths)
+
+        switch(baseline_indexes(), composite_indexes())
+        run('After (composite indexes)', paths)
+
+
+if __name__ == '__main__':
+    main()
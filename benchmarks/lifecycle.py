@@ -0,0 +1,264 @@
+"""Load test of the full workflow lifecycle through the WSGI stack
+
+Replays initiate, save, view, submit, review, rollback and list
+traffic of the demo workflow with Django's test client against a
+throwaway test database (SQLite by default, PostgreSQL with
+ENV=staging) and reports requests/sec, latency percentiles and
+queries per operation.
+
+Larger flows are simulated through data volume: more line items per
+activity, more rollback/resubmit cycles per request (longer task
+histories) and background requests seeded before the run.
+
+    python -m benchmarks.lifecycle --iterations 200 --output after.json
+    python -m benchmarks.lifecycle --compare before.json after.json
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+from collections import OrderedDict
+from datetime import datetime, timezone
+from time import perf_counter
+
+from benchmarks import create_users, setup, test_database
+
+
+OPERATIONS = (
+    'initiate', 'save', 'view', 'submit', 'review', 'rollback',
+    'history', 'list', 'inbox')
+
+
+def percentile(values, rank):
+    """Returns nearest-rank percentile of sorted values"""
+    index = max(0, int(round(rank / 100.0 * len(values) + 0.5)) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def activity_data(lines, **fields):
+    """Returns POST data of the initial activity"""
+    data = {'subject': 'Load', 'bar': 'Example', 'baz': 'WL', 'qux': ''}
+    data.update(fields)
+
+    for (prefix, suffix) in (('FooLineItemForm', ''), (
+            'FooMoreLineItemForm', 'more')):
+        data.update({
+            prefix + '-TOTAL_FORMS': lines,
+            prefix + '-INITIAL_FORMS': 0,
+            prefix + '-MIN_NUM_FORMS': 0,
+            prefix + '-MAX_NUM_FORMS': 1000})
+        for index in range(lines):
+            data['{}-{}-plugh{}'.format(prefix, index, suffix)] = 'Abc'
+            data['{}-{}-thud{}'.format(prefix, index, suffix)] = 'GR'
+
+    return data
+
+
+class Recorder(object):
+    """Times requests and counts their queries per operation"""
+    def __init__(self):
+        """Initializes Recorder"""
+        self.samples = OrderedDict((name, []) for name in OPERATIONS)
+        self.enabled = True
+
+    def __call__(self, operation, send, expected=(200, 302)):
+        """Issues a request, returns the response"""
+        from activflow.core.testing import QueryBudget
+
+        with QueryBudget() as queries:
+            start = perf_counter()
+            response = send()
+            elapsed = perf_counter() - start
+
+        if response.status_code not in expected:
+            raise RuntimeError('{} returned {}'.format(
+                operation, response.status_code))
+        if self.enabled:
+            self.samples[operation].append((elapsed, len(queries)))
+
+        return response
+
+    def results(self):
+        """Returns statistics per operation"""
+        results = OrderedDict()
+        for (name, samples) in self.samples.items():
+            if not samples:
+                continue
+            latencies = sorted(elapsed for (elapsed, _) in samples)
+            results[name] = OrderedDict([
+                ('requests', len(samples)),
+                ('rps', len(samples) / sum(latencies)),
+                ('p50_ms', percentile(latencies, 50) * 1000),
+                ('p95_ms', percentile(latencies, 95) * 1000),
+                ('p99_ms', percentile(latencies, 99) * 1000),
+                ('queries', sum(count for (_, count) in samples) / float(
+                    len(samples))),
+            ])
+        return results
+
+
+def lifecycle(record, submitter, reviewer, lines, cycles):
+    """Runs one request through its lifecycle"""
+    from django.urls import resolve, reverse
+
+    from activflow.core.models import Request
+    from activflow.tests.models import Foo
+
+    response = record('initiate', lambda: submitter.post(reverse(
+        'create', args=('tests', 'Foo', 'Initial')), activity_data(lines)))
+    foo = resolve(response.url).kwargs['pk']
+    update = reverse('update', args=('tests', 'Foo', foo))
+
+    record('save', lambda: submitter.post(
+        update, activity_data(0, save='Save')))
+    record('view', lambda: submitter.get(
+        reverse('view', args=('tests', 'Foo', foo))))
+
+    request = Foo.objects.values_list('task__request', flat=True).get(id=foo)
+    for cycle in range(cycles + 1):
+        record('submit', lambda: submitter.post(
+            update, activity_data(0, submit='corge_activity')))
+        record('inbox', lambda: reviewer.get(reverse('inbox')))
+
+        task = Request.objects.values_list(
+            'current_task', flat=True).get(id=request)
+        record('review', lambda: reviewer.post(reverse(
+            'create', args=('tests', 'Corge', task)), {
+                'grault': 'Example', 'thud': 1}))
+
+        if cycle < cycles:
+            record('rollback', lambda: reviewer.post(
+                reverse('rollback', args=('tests', task))))
+            foo = Request.objects.get(id=request).current_task.activity_id
+            update = reverse('update', args=('tests', 'Foo', foo))
+
+    record('history', lambda: submitter.get(
+        reverse('view', args=('tests', 'Foo', foo))))
+    record('list', lambda: submitter.get(
+        reverse('workflow-detail', args=['tests'])))
+
+
+def seed(submitter, count, lines):
+    """Initiates background requests"""
+    from activflow.core.bulk import initiate_requests
+
+    initiate_requests('tests', submitter, [{
+        'subject': 'Seed', 'bar': 'Example', 'baz': 'WL', 'qux': '',
+        'FooLineItem': [{'plugh': 'Abc', 'thud': 'GR'}] * lines
+    } for _ in range(count)])
+
+
+def metadata(args):
+    """Returns description of the run"""
+    from django.db import connection
+
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return OrderedDict([
+        ('commit', commit),
+        ('timestamp', datetime.now(timezone.utc).isoformat()),
+        ('database', connection.vendor),
+        ('python', platform.python_version()),
+        ('iterations', args.iterations),
+        ('lines', args.lines),
+        ('cycles', args.cycles),
+        ('background', args.background),
+    ])
+
+
+def print_results(title, results):
+    """Prints statistics as a table"""
+    print(title)
+    print('  {:<10} {:>8} {:>9} {:>9} {:>9} {:>9} {:>8}'.format(
+        'operation', 'requests', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms',
+        'queries'))
+    for (name, stats) in results.items():
+        print('  {:<10} {requests:>8} {rps:>9.1f} {p50_ms:>9.2f} '
+              '{p95_ms:>9.2f} {p99_ms:>9.2f} {queries:>8.1f}'.format(
+                  name, **stats))
+
+
+def compare(before, after):
+    """Prints changes between two result files"""
+    (before, after) = [json.load(open(path)) for path in (before, after)]
+    print('Comparing {} -> {}'.format(
+        before['meta']['commit'], after['meta']['commit']))
+    print('  {:<10} {:>10} {:>10} {:>10}'.format(
+        'operation', 'req/s', 'p95', 'queries'))
+
+    for (name, stats) in after['results'].items():
+        old = before['results'].get(name)
+        if not old:
+            continue
+        print('  {:<10} {:>+9.1f}% {:>+9.1f}% {:>+10.1f}'.format(
+            name,
+            (stats['rps'] / old['rps'] - 1) * 100,
+            (stats['p95_ms'] / old['p95_ms'] - 1) * 100,
+            stats['queries'] - old['queries']))
+
+
+def main():
+    """Entry Point"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--lines', type=int, default=2,
+                        help='line items per initial activity')
+    parser.add_argument('--cycles', type=int, default=1,
+                        help='rollback/resubmit cycles per request')
+    parser.add_argument('--background', type=int, default=0,
+                        help='requests seeded before the run')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    setup()
+
+    from django.test import Client
+
+    with test_database():
+        (john, jane) = create_users()
+        (submitter, reviewer) = (Client(), Client())
+        submitter.force_login(john)
+        reviewer.force_login(jane)
+        seed(john, args.background, args.lines)
+
+        record = Recorder()
+        record.enabled = False
+        for _ in range(args.warmup):
+            lifecycle(record, submitter, reviewer, args.lines, args.cycles)
+
+        record.enabled = True
+        start = perf_counter()
+        for _ in range(args.iterations):
+            lifecycle(record, submitter, reviewer, args.lines, args.cycles)
+        elapsed = perf_counter() - start
+
+        output = OrderedDict([
+            ('meta', metadata(args)),
+            ('total_rps', sum(len(samples) for samples in (
+                record.samples.values())) / elapsed),
+            ('results', record.results()),
+        ])
+
+    print_results('Lifecycle ({} iterations, {:.1f} req/s overall)'.format(
+        args.iterations, output['total_rps']), output['results'])
+
+    if args.output:
+        with open(args.output, 'w') as results:
+            json.dump(output, results, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Transition rule evaluation: rules reading related line items,
+evaluated for one activity (update page) with and without memoized
+results, and for a batch of activities (bulk submission) with
+undeclared relations (one query per activity) and declared,
+prefetched relations; five I/O-bound rules calling a local service
+stub (50 ms each) evaluated inline and on the thread pool
+
+    python -m benchmarks.rules [activities]
+"""
+
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.request import urlopen
+
+from benchmarks import create_users, measure, report, setup, test_database
+
+
+class StubService(ThreadingMixIn, HTTPServer):
+    """Local service answering after 50 ms"""
+    daemon_threads = True
+
+    class Handler(BaseHTTPRequestHandler):
+        """Answers every GET"""
+        def do_GET(self):
+            """Sleeps then answers"""
+            time.sleep(0.05)
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            """Keeps output quiet"""
+
+
+def service_rules(count):
+    """Returns I/O-bound rules calling the local service stub"""
+    from activflow.core.rules import io_bound
+
+    server = StubService(('127.0.0.1', 0), StubService.Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}/'.format(server.server_port)
+
+    @io_bound(timeout=1)
+    def rule(activity):
+        """Approved by the service"""
+        with urlopen(url) as response:
+            return response.status == 200
+
+    return {'transition{}'.format(index): rule for index in range(count)}
+
+
+def main():
+    """Entry Point"""
+    setup()
+
+    from django.test.utils import override_settings
+
+    from activflow.core.rules import depends_on, evaluate, results
+    from activflow.core.synthetic import Generator
+    from activflow.tests.models import Foo
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+    def undeclared(activity):
+        """Reads related items without declaring them"""
+        return len(activity.lines.all()) > 0
+
+    declared = depends_on(fields=['bar'], relations=['lines'])(
+        lambda activity: len(activity.lines.all()) > 0)
+    declared.__name__ = 'declared'
+
+    with test_database():
+        create_users()
+        Generator(['tests'], seed=42, lines=(2, 5)).generate(count)
+        identifier = Foo.objects.first().pk
+
+        def single():
+            """Evaluates the rule for the activity as loaded by a view"""
+            evaluate([(Foo.objects.get(pk=identifier), {
+                'corge_activity': declared})])
+
+        def batch(rule):
+            """Evaluates the rule for freshly loaded activities"""
+            return lambda: (results.clear(), evaluate([(activity, {
+                'corge_activity': rule}) for activity in Foo.objects.all()]))
+
+        with override_settings(ACTIVFLOW_RULE_CACHE_SIZE=0):
+            uncached = measure(single, number=200, repeat=3)
+        report('Update page (one activity)', {
+            'evaluated': uncached,
+            'memoized': measure(single, number=200, repeat=3)})
+
+        report('Bulk submission ({} activities)'.format(
+            Foo.objects.count()), {
+                'undeclared relations': measure(
+                    batch(undeclared), number=5, repeat=3),
+                'prefetched relations': measure(
+                    batch(declared), number=5, repeat=3)})
+
+        rules = service_rules(5)
+        foo = Foo.objects.first()
+
+        def services():
+            """Evaluates the I/O-bound rules"""
+            results.clear()
+            evaluate([(foo, rules)])
+
+        timings = {}
+        for workers in (0, 5):
+            with override_settings(ACTIVFLOW_RULE_WORKERS=workers):
+                timings['{} workers'.format(workers)] = measure(
+                    services, number=5, repeat=3)
+        report('Five I/O-bound rules (50 ms service)', timings)
+
+
+if __name__ == '__main__':
+    main()